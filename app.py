@@ -1,26 +1,44 @@
 from flask import Flask, render_template, request, redirect, url_for, jsonify, Response
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import func, or_, case
-# 위치별 건물명 분류 기준
-LOCATION_MAPPING = {
-    '마곡역': ['홈앤쇼핑', '류마타워1', '747타워', '퀸즈13', '595타워', '한일노벨리아', '엠비즈타워', '메가타워', 'W타워4', '엠시그니처', '류마타워2', '에이스타워2', '우성SB3', '엠리체', '로뎀타워', '푸리마타워', '퀸즈12', '지웰타워', '파인스퀘어', '그랑트윈타워', '메트로비즈', '메트로비즈타워', '사이언스타워2', 'LK빌딩', 'W타워3', '테크노타워2', '보타닉파크3', '이너매스1', '이너매스2', 'SH빌딩', '엠밸리 9단지', '르웨스트웍스', '원그로브', '케이스퀘어', '엠밸리 10단지'],
-    '발산역': ['나인스퀘어', '퀸즈11', '우성SB2', 'W타워2', '리더스타워', '대방빌딩', '열린M타워', '퀸즈9', '매그넘797', '퀸즈10', '엠펠리체', '에이스타워1', '건와빌딩', '마커스빌딩', '사이언스타', '사이언스타워1', '센트럴타워1', '장흥빌딩', '유바이오', '지투프라자', '보타닉파크2', '센테니아', '엘스타', '랑데르2', '리더스퀘어', '리더스에비뉴', '테크노타워1', '세움빌딩', '힐스테이트에코마곡', '발산파크프라자', '우성SB1', '문영비즈웍스', '사이언스파크뷰', '골든타워', '루체브릿지', '메이비원빌딩'],
-    '양천향교역': ['놀라움', '보타닉게이트', '뉴브클라우드힐스', '려산빌딩', '미라클빌딩', '델타빌딩', '보타닉파크프라자', '인방빌딩', '레인보우빌딩', '새싹빌딩'],
-    '마곡나루역': ['르웨스트시티', '7단지', '웰튼병원', '보타닉푸르지오', '보타닉푸르지오시티', '안강1', '안강2', '보타닉비즈', '랜드파크', '랜드타워', '센트럴타워2', '보타닉파크1', '보타닉비즈타워']
-}
-from flask import send_from_directory
+from flask_sqlalchemy.pagination import Pagination
+from sqlalchemy import func, or_, and_, false, case, insert, update, delete, select, table, column
+from sqlalchemy import event
+from sqlalchemy.orm import load_only, Session
+from sqlalchemy.exc import OperationalError
+# 위치별 건물명 분류 기준 (building_aliases.json 에서 로딩, 파일이 바뀌면 자동 갱신)
+LOCATION_MAPPING = {}
+from flask import send_from_directory, send_file
 
 import pandas as pd
 import re
 from datetime import datetime, timedelta
 import os
 from werkzeug.utils import secure_filename
+from werkzeug.security import safe_join
+from werkzeug.datastructures import MultiDict
 import zipfile
 import shutil
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw, ImageFont, ImageOps, UnidentifiedImageError, features
 import io
+import codecs
+import sqlite3
+import threading
+import uuid
+import base64
+import json
+import time
+from functools import lru_cache, partial
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import click
+
+# 📄 포스 PDF OCR 용 (페이지 OCR 은 앱 시작 작업이 없는 별도 모듈 → 프로세스 풀 자식이 가볍게 import)
+from pos_ocr import fitz, pytesseract, ocr_pdf_page
+import hashlib
+import math
+import stat
+import itertools
 
 from sqlalchemy import or_
 
@@ -65,14 +83,20 @@ os.makedirs(TEMP_FOLDER, exist_ok=True)
 app.config["SECRET_KEY"] = "super_secret_key_for_login_2025"
 
 
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///database.db'
+# 테스트 등에서는 DATABASE_URL 로 다른 DB 를 씀 (기본은 instance/database.db)
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get("DATABASE_URL", 'sqlite:///database.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 
 
 db = SQLAlchemy(app)
-# ✅ 마지막 엑셀 최신화 리포트(누락/파싱 실패 추적용)
-LAST_IMPORT_REPORT = None
+
+# ✅ SQLite FTS5(trigram) 사용 가능 여부 (서버 시작 시 확인)
+FTS_ENABLED = False
+property_fts = table("property_fts", column("rowid"), column("building_name"), column("private_memo"))
+
+# ✅ 건물명 정규화 결과 캐시 크기 (워커별, 자주 쓰는 건물명 수백 개면 충분)
+NORMALIZE_CACHE_SIZE = 4096
 
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -83,6 +107,18 @@ login_manager.session_protection = "strong"
 
 
 class Property(db.Model):
+    # ✅ 목록/검색 화면의 실제 조회 모양(거래구분 [+ 매물종류] 필터 → 금액/면적 정렬)에 맞춘 복합 인덱스
+    #    기존 DB에는 SCHEMA_MIGRATIONS 로 추가, `flask check-query-plans` 로 풀스캔 여부 점검
+    __table_args__ = (
+        db.Index("ix_property_category_rent", "category", "rent", "deposit"),
+        db.Index("ix_property_category_sale", "category", "sale_price"),
+        db.Index("ix_property_category_area", "category", "exclusive_area"),
+        db.Index("ix_property_category_type_rent", "category", "property_type", "rent", "deposit"),
+        db.Index("ix_property_category_type_sale", "category", "property_type", "sale_price"),
+        db.Index("ix_property_category_type_area", "category", "property_type", "exclusive_area"),
+        db.Index("ix_property_area", "exclusive_area"),
+    )
+
     status = db.Column(db.String(20), default='available')
     property_type = db.Column(db.String(50))
 
@@ -111,6 +147,9 @@ class Property(db.Model):
     has_interior = db.Column(db.Boolean, default=False)
     has_gonghang = db.Column(db.Boolean, default=False)
     has_corner = db.Column(db.Boolean, default=False)
+
+    # ✅ 가까운 역 (LOCATION_MAPPING 기준, 등록 시점에 정규화된 건물명으로 계산) → 역 필터는 인덱스 IN 조회
+    station = db.Column(db.String(20), index=True)
     
 
 
@@ -127,9 +166,16 @@ class Collection(db.Model):
 
 
 class CollectionItem(db.Model):
+    # ✅ 페이지에 보이는 매물들의 '이미 담김' 여부만 인덱스로 바로 조회
+    # ✅ 리스트 상세는 collection_id + 저장된 순서(position)로 바로 조회
+    __table_args__ = (
+        db.Index("ix_collection_item_property_collection", "property_id", "collection_id"),
+        db.Index("ix_collection_item_collection_position", "collection_id", "position"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    collection_id = db.Column(db.Integer)
-    property_id = db.Column(db.Integer)
+    collection_id = db.Column(db.Integer, db.ForeignKey("collection.id"))
+    property_id = db.Column(db.Integer, db.ForeignKey("property.id"))
     position = db.Column(db.Integer, default=0)
 
 class PropertyImage(db.Model):
@@ -139,6 +185,50 @@ class PropertyImage(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 
+# ✅ 카톡 TXT 증분 등록용 high-water mark (대화방 + 매물종류별 마지막 반영 메시지)
+class KakaoImportMark(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    chat_key = db.Column(db.String(200), index=True)
+    property_type = db.Column(db.String(50))
+    last_ts = db.Column(db.DateTime)
+    last_hash = db.Column(db.String(40))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# ✅ 백그라운드 등록 작업 (카톡 TXT 등): 업로드 요청은 작업만 넣고 바로 응답 → 진행률은 /api/import_jobs/<id>
+#    DB에 저장하므로 어느 gunicorn 워커가 받아서 처리하든, 어느 워커에서 조회하든 같은 상태
+class ImportJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(30))
+    status = db.Column(db.String(20), default="queued", index=True)  # queued / running / done / failed
+    file_path = db.Column(db.String(300))
+    params = db.Column(db.Text)  # JSON
+    progress = db.Column(db.Float, default=0)
+    message = db.Column(db.String(200))
+    result = db.Column(db.Integer)
+    report = db.Column(db.Text)  # JSON (읽은/반영/실패 행 수 등 가져오기 리포트)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": round(self.progress or 0, 3),
+            "message": self.message,
+            "result": self.result,
+            "report": json.loads(self.report) if self.report else None,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(50), unique=True)
@@ -149,6 +239,60 @@ def load_user(user_id):
     return User.query.get(int(user_id))
 
 
+# ✅ 버전 관리 스키마 마이그레이션 (PRAGMA user_version 에 적용된 마지막 버전을 기록)
+#    새 인덱스/컬럼은 여기 다음 번호로 추가 → 기존 DB는 시작할 때 한 번만 적용됨
+SCHEMA_MIGRATIONS = [
+    (1, [
+        "CREATE INDEX IF NOT EXISTS ix_property_category_rent ON property (category, rent, deposit)",
+        "CREATE INDEX IF NOT EXISTS ix_property_category_sale ON property (category, sale_price)",
+        "CREATE INDEX IF NOT EXISTS ix_property_category_area ON property (category, exclusive_area)",
+        "CREATE INDEX IF NOT EXISTS ix_property_category_type_rent ON property (category, property_type, rent, deposit)",
+        "CREATE INDEX IF NOT EXISTS ix_property_category_type_sale ON property (category, property_type, sale_price)",
+        "CREATE INDEX IF NOT EXISTS ix_property_category_type_area ON property (category, property_type, exclusive_area)",
+        "CREATE INDEX IF NOT EXISTS ix_property_area ON property (exclusive_area)",
+    ]),
+    # 매물 데이터 세대(generation) 번호: 매물이 바뀔 때마다 1 올림 → 목록 결과 캐시 무효화 (_bump_generation_* 이벤트)
+    (2, [
+        "CREATE TABLE IF NOT EXISTS data_generation (id INTEGER PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0)",
+        "INSERT OR IGNORE INTO data_generation (id, value) VALUES (1, 0)",
+    ]),
+    # 워커 여러 개가 공유하는 작은 상태값 (예: station 을 마지막으로 다시 계산한 별칭 파일 해시)
+    (3, [
+        "CREATE TABLE IF NOT EXISTS app_meta (key TEXT PRIMARY KEY, value TEXT)",
+        "INSERT OR IGNORE INTO app_meta (key, value) VALUES ('station_alias_digest', '')",
+    ]),
+    # 가져오기 리포트를 작업 기록에 저장 (어느 워커에서든 /api/stats 로 조회, 재시작해도 남음)
+    (4, [
+        "ALTER TABLE import_job ADD COLUMN report TEXT",
+    ]),
+    # DB 고유값: DB 를 새로 만들거나 다른 파일로 바꾸면 달라짐 → 목록 결과 캐시 키에 포함
+    (5, [
+        "INSERT OR IGNORE INTO app_meta (key, value) VALUES ('db_identity', lower(hex(randomblob(16))))",
+    ]),
+]
+
+
+def run_schema_migrations():
+    current = db.session.execute(db.text("PRAGMA user_version")).scalar() or 0
+    for version, statements in SCHEMA_MIGRATIONS:
+        if version <= current:
+            continue
+        try:
+            for sql in statements:
+                try:
+                    db.session.execute(db.text(sql))
+                except OperationalError as e:
+                    # 새 DB 는 create_all 이 이미 컬럼까지 만들어 둠
+                    if "duplicate column name" not in str(e):
+                        raise
+            db.session.execute(db.text(f"PRAGMA user_version = {int(version)}"))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"스키마 마이그레이션 {version} 실패: {e}")
+            break
+
+
 with app.app_context():
     db.create_all()
     
@@ -173,6 +317,62 @@ with app.app_context():
     except:
         pass
 
+    # ✅ 기존 DB에 station 컬럼 + 인덱스 안전하게 추가 (값 채우기는 backfill_station)
+    try:
+        db.session.execute(db.text('ALTER TABLE property ADD COLUMN station VARCHAR(20)'))
+        db.session.commit()
+    except:
+        pass
+    db.session.execute(db.text('CREATE INDEX IF NOT EXISTS ix_property_station ON property (station)'))
+    db.session.commit()
+
+    # ✅ 기존 DB에 리스트 담기 조회용 복합 인덱스 추가
+    db.session.execute(db.text('CREATE INDEX IF NOT EXISTS ix_collection_item_property_collection ON collection_item (property_id, collection_id)'))
+    db.session.execute(db.text('CREATE INDEX IF NOT EXISTS ix_collection_item_collection_position ON collection_item (collection_id, position)'))
+    db.session.commit()
+
+    # ✅ 건물명/비공개메모 부분검색용 FTS5 인덱스 (trigram → 한글 부분 일치) + 자동 동기화 트리거
+    #    등록/수정/삭제 어떤 경로로 바뀌어도 트리거가 같이 갱신함
+    try:
+        fts_exists = db.session.execute(db.text(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='property_fts'"
+        )).first()
+        db.session.execute(db.text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS property_fts USING fts5("
+            "building_name, private_memo, content='property', content_rowid='id', tokenize='trigram')"
+        ))
+        db.session.execute(db.text("""
+            CREATE TRIGGER IF NOT EXISTS property_fts_ai AFTER INSERT ON property BEGIN
+                INSERT INTO property_fts(rowid, building_name, private_memo)
+                VALUES (new.id, new.building_name, new.private_memo);
+            END
+        """))
+        db.session.execute(db.text("""
+            CREATE TRIGGER IF NOT EXISTS property_fts_ad AFTER DELETE ON property BEGIN
+                INSERT INTO property_fts(property_fts, rowid, building_name, private_memo)
+                VALUES ('delete', old.id, old.building_name, old.private_memo);
+            END
+        """))
+        db.session.execute(db.text("""
+            CREATE TRIGGER IF NOT EXISTS property_fts_au AFTER UPDATE OF building_name, private_memo ON property BEGIN
+                INSERT INTO property_fts(property_fts, rowid, building_name, private_memo)
+                VALUES ('delete', old.id, old.building_name, old.private_memo);
+                INSERT INTO property_fts(rowid, building_name, private_memo)
+                VALUES (new.id, new.building_name, new.private_memo);
+            END
+        """))
+        if not fts_exists:
+            # 기존 매물 전체를 한 번 색인
+            db.session.execute(db.text("INSERT INTO property_fts(property_fts) VALUES ('rebuild')"))
+        db.session.commit()
+        FTS_ENABLED = True
+    except Exception as e:
+        db.session.rollback()
+        print(f"FTS5 검색 인덱스 생성 실패 (LIKE 검색으로 동작): {e}")
+
+    # ✅ 버전별 스키마 마이그레이션 (목록/검색용 복합 인덱스 등)
+    run_schema_migrations()
+
     # 🔥 관리자 계정 생성 및 강제 업데이트
     user = User.query.first()
     if not user:
@@ -185,6 +385,12 @@ with app.app_context():
 
 
 
+def _chunks(seq, size=500):
+    """SQLite IN (...) 변수 개수 제한을 피하기 위해 리스트를 잘라서 돌려줌"""
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+
 def to_pyung(value):
     try:
         return round(float(value) / 3.3, 2)
@@ -249,6 +455,7 @@ def safe_float_from_text(text):
         return 0.0
 
 
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
 def building_name_from_private_memo(private_memo: str) -> str:
     """
     비공개메모에서 '...호'까지를 매물카드 건물명으로 사용
@@ -300,11 +507,25 @@ def _parse_price_from_pdf(deal_type: str, price_text: str):
 
 
 def _cluster_rows_by_y(items, y_tol=16):
+    """
+    단어 박스를 y 기준으로 한 번 정렬한 뒤 위에서 아래로 훑으며 행으로 묶음
+    - 박스는 이전처럼 '먼저 만들어진 행 중 세로 중심이 y_tol 안인 첫 행'에 들어감
+    - 행 중심 + y_tol 이 지금 박스의 y 보다 위인 행은 앞으로 어떤 박스도 못 들어오므로
+      (뒤 박스의 중심 ≥ y) 비교 대상에서 빼고, 근처 몇 개 행만 비교 → 정렬 후 선형 시간
+    """
     rows = []
+    active = []
     for it in sorted(items, key=lambda z: (z["y"], z["x"])):
         cy = it["y"] + it["h"] / 2
+
+        # 지나간 행 정리 (만들어진 순서는 유지)
+        while active and active[0]["cy"] + y_tol < it["y"]:
+            active.pop(0)
+        if len(active) > 32:
+            active = [r for r in active if r["cy"] + y_tol >= it["y"]]
+
         placed = False
-        for r in rows:
+        for r in active:
             if abs(cy - r["cy"]) <= y_tol:
                 r["items"].append(it)
                 r["cy"] = (r["cy"] * r["n"] + cy) / (r["n"] + 1)
@@ -312,256 +533,382 @@ def _cluster_rows_by_y(items, y_tol=16):
                 placed = True
                 break
         if not placed:
-            rows.append({"cy": cy, "n": 1, "items": [it]})
+            row = {"cy": cy, "n": 1, "items": [it]}
+            rows.append(row)
+            active.append(row)
     return rows
 
 
-def _text_in_xrange(row_items, x0, x1):
-    parts = []
-    for it in sorted(row_items, key=lambda z: z["x"]):
+def _texts_in_xranges(row_items, ranges):
+    """
+    한 행의 단어들을 x 순서로 한 번만 훑어서 열 구간(ranges)별 텍스트로 나눔
+    (구간 경계가 겹치면 이전과 같이 양쪽 열에 모두 들어감)
+    """
+    buckets = [[] for _ in ranges]
+    for it in row_items:
         cx = it["x"] + it["w"] / 2
-        if x0 <= cx <= x1:
-            parts.append(it["text"])
-    s = " ".join(parts).strip()
-    return re.sub(r"\s+", " ", s)
+        for bucket, (x0, x1) in zip(buckets, ranges):
+            if x0 <= cx <= x1:
+                bucket.append(it["text"])
+    return [re.sub(r"\s+", " ", " ".join(parts).strip()) for parts in buckets]
 
 
-def extract_rows_from_pos_pdf(pdf_path: str):
-    """
-    포스 '매물인쇄' PDF(이미지 기반) → OCR → 표 row 추출
-    반환: [{property_type, area_m2, deal_type, price_text, private_memo}]
-    """
-    if fitz is None or pytesseract is None:
-        raise RuntimeError("PyMuPDF(fitz) 또는 pytesseract가 설치되지 않았습니다.")
+# ✅ 포스 PDF OCR 설정 (페이지 렌더링 + tesseract 를 프로세스 풀로 나눠서 실행, pos_ocr.ocr_pdf_page)
+app.config.setdefault("OCR_WORKERS", os.cpu_count() or 1)
 
-    doc = fitz.open(pdf_path)
-    all_rows = []
+# ✅ 페이지 OCR 결과 캐시 폴더 (캐시 파일 읽기/쓰기는 pos_ocr 에서)
+app.config.setdefault("OCR_CACHE_FOLDER", os.path.join(app.instance_path, "ocr_cache"))
+app.config.setdefault("OCR_CACHE_MAX_BYTES", 200 * 1024 * 1024)
+
+
+def _prune_cache_folder(cache_dir, max_bytes):
+    """캐시 폴더가 max_bytes 를 넘으면 오래 안 쓴(수정시간이 오래된) 파일부터 삭제 → 삭제한 파일 수"""
+    try:
+        entries = [e for e in os.scandir(cache_dir) if e.is_file() and not e.name.endswith(".tmp")]
+    except OSError:
+        return 0
 
-    for pi in range(doc.page_count):
-        page = doc.load_page(pi)
+    stats = sorted(((e.stat().st_mtime, e.stat().st_size, e.path) for e in entries), reverse=True)
+    total = sum(size for _, size, _ in stats)
+    evicted = 0
+    while stats and total > max_bytes:
+        _, size, path = stats.pop()
+        try:
+            os.remove(path)
+            total -= size
+            evicted += 1
+        except OSError:
+            pass
+    return evicted
 
-        # 확대 렌더(정확도↑)
-        mat = fitz.Matrix(2, 2)
-        pix = page.get_pixmap(matrix=mat, alpha=False)
-        img = Image.open(io.BytesIO(pix.tobytes("png"))).convert("RGB")
 
-        data = pytesseract.image_to_data(img, lang="kor+eng", output_type=pytesseract.Output.DICT)
+def prune_ocr_cache(cache_dir=None, max_bytes=None):
+    """OCR 캐시 폴더가 max_bytes 를 넘으면 오래 안 쓴 페이지부터 삭제 → 삭제한 파일 수"""
+    cache_dir = cache_dir or app.config["OCR_CACHE_FOLDER"]
+    max_bytes = app.config["OCR_CACHE_MAX_BYTES"] if max_bytes is None else max_bytes
+    return _prune_cache_folder(cache_dir, max_bytes)
 
-        items = []
-        n = len(data.get("text", []))
-        for i in range(n):
-            text = (data["text"][i] or "").strip()
-            if not text:
-                continue
-            try:
-                conf = float(data["conf"][i])
-            except:
-                conf = -1
-            if conf < 40:
-                continue
-            items.append({
-                "text": text,
-                "x": int(data["left"][i]),
-                "y": int(data["top"][i]),
-                "w": int(data["width"][i]),
-                "h": int(data["height"][i]),
-                "conf": conf
-            })
-
-        if not items:
+
+def _rows_from_page_items(items, W, H):
+    """한 페이지의 OCR 단어 박스 → 표 row 목록"""
+    rows = []
+    if not items:
+        return rows
+
+    xr = lambda a: int(W * a)
+
+    # ✅ 포스 표 레이아웃(비율 기반)
+    X_PROPERTY_TYPE = (xr(0.09), xr(0.17))
+    X_AREA          = (xr(0.52), xr(0.60))
+    X_DEAL          = (xr(0.60), xr(0.66))
+    X_PRICE         = (xr(0.66), xr(0.74))
+    X_MEMO          = (xr(0.74), xr(0.99))
+
+    column_ranges = (X_PROPERTY_TYPE, X_AREA, X_DEAL, X_PRICE, X_MEMO)
+    row_clusters = _cluster_rows_by_y(items, y_tol=16)
+
+    for r in row_clusters:
+        # x 정렬은 행마다 한 번만 (전체 줄 + 열 나누기 공용)
+        row_items = sorted(r["items"], key=lambda z: z["x"])
+        whole_line = " ".join([x["text"] for x in row_items])
+
+        # 헤더/잡음 제거
+        if "매물인쇄" in whole_line:
+            continue
+        if "매물종류" in whole_line and "비공개메모" in whole_line:
+            continue
+        if "page" in whole_line.lower():
             continue
 
-        W, H = img.size
-        xr = lambda a: int(W * a)
+        type_text, area_text, deal_text, price_text, private_memo = _texts_in_xranges(row_items, column_ranges)
+        property_type = convert_property_type(type_text)
 
-        # ✅ 포스 표 레이아웃(비율 기반)
-        X_PROPERTY_TYPE = (xr(0.09), xr(0.17))
-        X_AREA          = (xr(0.52), xr(0.60))
-        X_DEAL          = (xr(0.60), xr(0.66))
-        X_PRICE         = (xr(0.66), xr(0.74))
-        X_MEMO          = (xr(0.74), xr(0.99))
+        if not private_memo:
+            continue
 
-        row_clusters = _cluster_rows_by_y(items, y_tol=16)
+        deal_type = ""
+        if "월세" in deal_text:
+            deal_type = "월세"
+        elif "매매" in deal_text:
+            deal_type = "매매"
+        else:
+            deal_type = "월세" if "/" in (price_text or "") else ""
 
-        for r in row_clusters:
-            row_items = r["items"]
-            whole_line = " ".join([x["text"] for x in sorted(row_items, key=lambda z: z["x"])])
+        area_m2 = safe_float_from_text(area_text)
 
-            # 헤더/잡음 제거
-            if "매물인쇄" in whole_line:
-                continue
-            if "매물종류" in whole_line and "비공개메모" in whole_line:
-                continue
-            if "page" in whole_line.lower():
-                continue
+        rows.append({
+            "property_type": property_type,
+            "area_m2": area_m2,
+            "deal_type": deal_type,
+            "price_text": price_text,
+            "private_memo": private_memo
+        })
+    return rows
 
-            property_type = convert_property_type(_text_in_xrange(row_items, *X_PROPERTY_TYPE))
-            area_text     = _text_in_xrange(row_items, *X_AREA)
-            deal_text     = _text_in_xrange(row_items, *X_DEAL)
-            price_text    = _text_in_xrange(row_items, *X_PRICE)
-            private_memo  = _text_in_xrange(row_items, *X_MEMO)
 
-            if not private_memo:
-                continue
+def iter_rows_from_pos_pdf(pdf_path: str, workers=None, use_cache=True, stats=None, on_page=None):
+    """
+    포스 '매물인쇄' PDF(이미지 기반) → OCR → 표 row 를 페이지 순서대로 하나씩 내보냄
+    - 페이지들을 workers 개 프로세스로 나눠 OCR (기본 app.config["OCR_WORKERS"])
+    - 앞 페이지가 끝나는 대로 바로 내보내고, 순서는 항상 1페이지부터
+    - stats(dict) 를 주면 pages / ocr_cache_hits / ocr_cache_misses 를 채움
+    - on_page(끝난 페이지 수, 전체 페이지 수) 를 주면 페이지 OCR 이 끝날 때마다 호출 (작업 진행률)
+    """
+    if fitz is None or pytesseract is None:
+        raise RuntimeError("PyMuPDF(fitz) 또는 pytesseract가 설치되지 않았습니다.")
 
-            deal_type = ""
-            if "월세" in deal_text:
-                deal_type = "월세"
-            elif "매매" in deal_text:
-                deal_type = "매매"
-            else:
-                deal_type = "월세" if "/" in (price_text or "") else ""
+    doc = fitz.open(pdf_path)
+    page_count = doc.page_count
+    doc.close()
+
+    cache_dir = app.config["OCR_CACHE_FOLDER"] if use_cache else None
+    if stats is None:
+        stats = {}
+    stats.update(pages=page_count, ocr_cache_hits=0, ocr_cache_misses=0)
+
+    def page_rows(result):
+        items, (W, H), hit = result
+        stats["ocr_cache_hits" if hit else "ocr_cache_misses"] += 1
+        if on_page:
+            on_page(stats["ocr_cache_hits"] + stats["ocr_cache_misses"], page_count)
+        return _rows_from_page_items(items, W, H)
+
+    workers = max(1, min(int(workers or app.config["OCR_WORKERS"]), page_count or 1))
+    if workers == 1:
+        for pi in range(page_count):
+            yield from page_rows(ocr_pdf_page(pdf_path, pi, cache_dir=cache_dir))
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        try:
+            # map 은 끝난 순서가 아니라 페이지 순서대로 결과를 돌려줌
+            results = pool.map(partial(ocr_pdf_page, cache_dir=cache_dir), itertools.repeat(pdf_path), range(page_count))
+            for result in results:
+                yield from page_rows(result)
+        finally:
+            # 중간에 그만 읽으면 남은 페이지는 취소
+            pool.shutdown(wait=True, cancel_futures=True)
 
-            area_m2 = safe_float_from_text(area_text)
+    if cache_dir:
+        stats["ocr_cache_evicted"] = prune_ocr_cache(cache_dir)
 
-            all_rows.append({
-                "property_type": property_type,
-                "area_m2": area_m2,
-                "deal_type": deal_type,
-                "price_text": price_text,
-                "private_memo": private_memo
-            })
 
-    return all_rows
+def extract_rows_from_pos_pdf(pdf_path: str, workers=None, use_cache=True):
+    """
+    포스 '매물인쇄' PDF(이미지 기반) → OCR → 표 row 추출
+    반환: (rows, 리포트 dict)
+    - rows: [{property_type, area_m2, deal_type, price_text, private_memo}]
+    - 리포트: 페이지 수 / OCR 캐시 적중 수 / 걸린 시간 (작업 기록에 저장하는 건 호출한 쪽)
+    """
+    stats = {}
+    started = time.perf_counter()
+    rows = list(iter_rows_from_pos_pdf(pdf_path, workers=workers, use_cache=use_cache, stats=stats))
+    return rows, _pos_pdf_report(pdf_path, started, len(rows), stats)
+
+
+def _pos_pdf_report(pdf_path, started, row_count, stats):
+    return {
+        "source": "pos_pdf",
+        "file": os.path.basename(pdf_path),
+        "finished_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "seconds": round(time.perf_counter() - started, 2),
+        "rows": row_count,
+        **stats,
+    }
+
+
+@app.cli.command("bench-pos-ocr")
+@click.argument("pdf_path")
+@click.option("--workers", default="1,2,4", help="비교할 프로세스 수 (쉼표 구분)")
+def bench_pos_ocr_command(pdf_path, workers):
+    """flask bench-pos-ocr 매물인쇄.pdf --workers 1,4 : 프로세스 수별 OCR 시간 비교 (결과 동일 여부 포함)"""
+    baseline = None
+    for n in [int(w) for w in workers.split(",") if w.strip()]:
+        started = time.perf_counter()
+        rows, _ = extract_rows_from_pos_pdf(pdf_path, workers=n, use_cache=False)
+        elapsed = time.perf_counter() - started
+        if baseline is None:
+            baseline = (rows, elapsed)
+        same = "같음" if rows == baseline[0] else "다름!"
+        print(f"workers={n}: {elapsed:.1f}초, {len(rows)}행, x{baseline[1] / elapsed:.2f}, 결과 {same}")
+
+
+
+
+def _normalize_ryuma(text):
+    # 🚀 류마타워 완벽 패치 (기존 유지)
+    m = re.search(r"류마타워\s*([12])(?:차)?(?!\d)", text)
+    if m:
+        return re.sub(r"류마타워\s*[12](?:차)?\s*", f"류마타워{m.group(1)} ", text, count=1)
+    return re.sub(r"류마타워\s*", "류마타워1 ", text)
+
+
+# ✅ 별칭 규칙표는 building_aliases.json 에 있음 (위에서부터 순서대로 적용 — 순서가 곧 우선순위)
+#   ["replace", 찾을말, 바꿀말]
+#   ["replace_if", 조건글자, 찾을말, 바꿀말] : 조건글자가 있을 때만 (랜드파크 전용 패치)
+#   ["regex", 필수글자, 패턴, 바꿀말]        : 필수글자가 없으면 절대 걸리지 않는 re.sub
+#   ["func", 필수글자, 함수이름]             : ALIAS_FUNCS 에 등록된 파이썬 함수
+#   "# ..."                                   : 설명용 주석 (무시)
+ALIAS_FUNCS = {
+    "ryuma": _normalize_ryuma,
+}
 
 
+def _trie_pattern(words):
+    """리터럴 목록 → 접두사를 공유하는 정규식 (대안 100개를 하나씩 시도하지 않도록)"""
+    trie = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = True
 
+    def build(node):
+        end = "" in node
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if end:
+            body = "(?:" + body + ")?"
+        return body
 
-def normalize_dong(text):
+    return build(trie)
 
-    # A동
-    text = text.replace("제에이동", "A동").replace("에이동", "A동").replace("제A동", "A동").replace("제에이", "A동")
-    text = text.replace("제오 에이", "A동").replace("제오에이", "A동")
 
-    # B동
-    text = text.replace("제비동", "B동").replace("비동", "B동").replace("제B동", "B동").replace("제비", "B동")
+class AliasMatcher:
+    """
+    별칭 규칙표를 한 번 컴파일해서 건물명을 한 번에 훑는 매처
+    - 모든 규칙의 필수글자를 하나의 trie 정규식으로 묶어 문자열을 한 번만 스캔
+    - 지금 문자열에 필수글자가 있는 규칙만 원래 순서대로 실행 (없는 규칙은 원래도 아무 변화 없음)
+    - 규칙이 실제로 글자를 바꾼 경우에만 다시 스캔 → 결과는 규칙을 순서대로 전부 돌린 것과 100% 동일
+    """
 
-    # 🔥 랜드파크 전용 패치 (오비 = B동)
-    if "랜드파크" in text:
-        text = text.replace("제오비동", "B동")
-        text = text.replace("오비동", "B동")
-        text = text.replace("제오비", "B동")
-        text = text.replace("오비", "B동")
+    def __init__(self, rules):
+        self.rules = []
+        for rule in rules:
+            if isinstance(rule, str):
+                continue
+            kind = rule[0]
+            if kind == "replace":
+                _, old, new = rule
+                self.rules.append((old, lambda t, old=old, new=new: t.replace(old, new)))
+            elif kind == "replace_if":
+                _, guard, old, new = rule
+                self.rules.append((old, lambda t, guard=guard, old=old, new=new: t.replace(old, new) if guard in t else t))
+            elif kind == "regex":
+                _, trigger, pattern, repl = rule
+                compiled = re.compile(pattern)
+                self.rules.append((trigger, lambda t, compiled=compiled, repl=repl: compiled.sub(repl, t)))
+            elif kind == "func":
+                _, trigger, fn_name = rule
+                self.rules.append((trigger, ALIAS_FUNCS[fn_name]))
+            else:
+                raise ValueError(f"알 수 없는 별칭 규칙: {rule!r}")
+
+        triggers = sorted({trigger for trigger, _ in self.rules})
+        # 같은 위치에서 가장 긴 필수글자만 잡히므로, 그 글자의 접두사인 필수글자도 같이 '있음' 처리
+        self._implied = {t: frozenset(p for p in triggers if t.startswith(p)) for t in triggers}
+        self._scan = re.compile("(?=(" + _trie_pattern(triggers) + "))")
+
+    def present(self, text):
+        found = set()
+        for m in self._scan.finditer(text):
+            found |= self._implied[m.group(1)]
+        return found
+
+    def apply(self, text):
+        present = self.present(text)
+        if not present:
+            return text
+        for trigger, fn in self.rules:
+            if trigger in present:
+                new_text = fn(text)
+                if new_text != text:
+                    text = new_text
+                    present = self.present(text)
+        return text
+
+
+# 📂 별칭 규칙 파일 (각 gunicorn 워커가 수정시간을 보고 알아서 다시 읽음 → 재시작 불필요)
+app.config["ALIAS_FILE"] = os.path.join(os.path.dirname(os.path.abspath(__file__)), "building_aliases.json")
+ALIAS_RELOAD_INTERVAL = 5  # 초: 이 간격마다 파일 수정시간만 확인 (평소엔 stat 한 번도 안 함)
+
+ALIAS_STATE = {"version": None, "mtime": None, "checked_at": 0.0}
+ALIAS_RELOAD_HOOKS = []  # 규칙이 바뀔 때 호출할 캐시 비우기 함수들
+
+
+def _load_alias_table(path):
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+
+    dong_rules = data.get("dong_rules", [])
+    building_rules = data.get("building_rules", [])
+    matchers = (
+        AliasMatcher(dong_rules),
+        AliasMatcher(building_rules),
+        # clean_building_name 은 동 규칙 → 건물 규칙을 이어서 한 번에 적용
+        AliasMatcher(dong_rules + building_rules),
+    )
+    return data.get("version"), data.get("location_mapping", {}), matchers
+
+
+def refresh_alias_table(force=False):
+    """별칭 규칙 파일이 바뀌었으면 다시 컴파일. 바뀐 경우에만 True"""
+    global _DONG_MATCHER, _BUILDING_MATCHER, _ALIAS_MATCHER
+
+    now = time.monotonic()
+    if not force and now - ALIAS_STATE["checked_at"] < ALIAS_RELOAD_INTERVAL:
+        return False
+    ALIAS_STATE["checked_at"] = now
 
-    # C동
-    text = text.replace("제씨동", "C동").replace("씨동", "C동").replace("제C동", "C동").replace("제씨", "C동").replace("제오씨", "C동")
+    path = app.config["ALIAS_FILE"]
+    mtime = None
+    try:
+        mtime = os.stat(path).st_mtime_ns
+        if not force and mtime == ALIAS_STATE["mtime"]:
+            return False
+        version, mapping, matchers = _load_alias_table(path)
+        with open(path, "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+    except Exception as e:
+        if ALIAS_STATE["mtime"] is None:
+            raise
+        # 잘못 저장된 파일이면 기존 규칙을 그대로 유지 (같은 파일로 다시 시도하지 않음)
+        print(f"별칭 규칙 파일 로딩 실패 (기존 규칙 유지): {e}")
+        ALIAS_STATE["mtime"] = mtime or ALIAS_STATE["mtime"]
+        return False
+
+    _DONG_MATCHER, _BUILDING_MATCHER, _ALIAS_MATCHER = matchers
+    LOCATION_MAPPING.clear()
+    LOCATION_MAPPING.update(mapping)
+    ALIAS_STATE.update(version=version, mtime=mtime, digest=digest)
+    # 규칙이 바뀌었으니 예전 규칙으로 만든 캐시들은 버림
+    for hook in ALIAS_RELOAD_HOOKS:
+        hook()
+    return True
 
-    # 🔥 랜드파크 전용 패치 (오씨 = C동)
-    if "랜드파크" in text:
-        text = text.replace("오씨동", "C동")
-        text = text.replace("오씨", "C동")
 
-    # D동
-    text = text.replace("제디동", "D동").replace("디동", "D동").replace("제D동", "D동").replace("제디", "D동")
+refresh_alias_table(force=True)
+
+
+def normalize_dong(text):
+    refresh_alias_table()
+    return _DONG_MATCHER.apply(text)
 
-    return text
 
 def normalize_building_custom(text):
-    # 🚀 류마타워 완벽 패치 (기존 유지)
-    if "류마타워" in text:
-        m = re.search(r"류마타워\s*([12])(?:차)?(?!\d)", text)
-        if m:
-            text = re.sub(r"류마타워\s*[12](?:차)?\s*", f"류마타워{m.group(1)} ", text, count=1)
-        else:
-            text = re.sub(r"류마타워\s*", "류마타워1 ", text)
-
-    # 🚨 퀸즈파크 관련 잡다한 '문영' 떼기 (기존 유지)
-    text = re.sub(r'문영\s*퀸즈', '퀸즈', text)
-    text = re.sub(r'퀸즈파크\s*나인', '퀸즈9', text)
-    text = re.sub(r'퀸즈파크\s*9차', '퀸즈9', text)
-    text = re.sub(r'퀸즈파크\s*텐', '퀸즈10', text)
-    text = re.sub(r'퀸즈파크\s*10차', '퀸즈10', text)
-    text = re.sub(r'퀸즈파크\s*11차', '퀸즈11', text)
-    text = re.sub(r'퀸즈파크\s*12차', '퀸즈12', text)
-    text = re.sub(r'퀸즈파크\s*13차', '퀸즈13', text)
-    
-    # [수정] 그랑트윈타워 및 주요 명칭 통일 (기존 유지 + 마곡동 제거 강화)
-    text = text.replace("두산더랜드파크", "랜드파크")
-    text = text.replace("더랜드파크", "랜드파크")
-    text = text.replace("마곡동 그랑트윈타워", "그랑트윈타워")
-    text = text.replace("마곡그랑트윈타워", "그랑트윈타워")
-    # 🔥 마곡동 붙은 모든 그랑트윈 제거 (공백/붙임 모두 대응)
-    text = re.sub(r"마곡동\s*그랑트윈타워", "그랑트윈타워", text)
-    text = text.replace("마곡동그랑트윈타워", "그랑트윈타워")
-    text = text.replace("747타워", "747").replace("747", "747타워")
-
-    # 🔥 소장님 특별 요청 패치 (기존 유지)
-    text = text.replace("마곡595", "595타워")
-    text = re.sub(r"롯데캐슬\s*르웨스트.*", "르웨스트웍스", text)
-    text = text.replace("홈앤쇼핑사옥", "홈앤쇼핑")
-    text = text.replace("웰튼메디플렉스", "웰튼병원")
-
-    # 기타 자주 쓰이는 이름들 (소장님의 소중한 리스트 100% 유지)
-    text = text.replace("마곡엠밸리9단지 제업무시설동", "엠밸리 9단지")
-    text = text.replace("마곡엠밸리9단지 제판매시설2동", "엠밸리 9단지")
-    text = text.replace("발산더블유타워", "W타워2")
-    text = text.replace("열린엠타워2", "열린M타워")
-    text = text.replace("외 1필지 마곡역한일노벨리아타워", "한일노벨리아")
-    text = text.replace("외 2필지 가양역더스카이밸리5차 지식산업센터", "스카이밸리")
-    text = text.replace("마곡지웰타워", "지웰타워")
-    text = text.replace("이너매스마곡2", "이너매스2")
-    text = text.replace("놀라움마곡지식산업센터", "놀라움")
-    text = text.replace("엠밸리더블유타워3주1", "W타워3")
-    text = text.replace("엠밸리더블유타워4", "W타워4")
-    text = text.replace("에이스타워마곡", "에이스타워1")
-    text = text.replace("마곡사이언스타워2", "사이언스타워2")
-    text = text.replace("마곡엠시그니처", "엠시그니처")
-    text = text.replace("마곡센트럴타워2", "센트럴타워2")
-    text = text.replace("마곡나루역프라이빗타워2", "안강2")
-    text = text.replace("외 1필지 아벨테크노", "아벨테크노")
-    text = text.replace("마곡테크노타워2", "테크노타워2")
-    text = text.replace("리더스퀘어마곡", "리더스퀘어")
-    text = text.replace("이너매스마곡1", "이너매스1")
-    text = text.replace("우성에스비타워2", "우성SB2")
-    text = text.replace("우성에스비타워", "우성SB1") 
-    text = text.replace("우성에스비", "우성SB1")   
-    text = text.replace("마곡에스비타워3", "우성SB3")
-    text = text.replace("한양더챔버 1동", "한양더챔버")
-    text = text.replace("마곡센트럴타워1", "센트럴타워1")
-    text = text.replace("외 1필지 제원그로브업무", "원그로브")
-    text = text.replace("외 1필지 원그로브업무", "원그로브")
-    text = text.replace("리더스타워마곡", "리더스타워")
-    text = text.replace("마곡나루역보타닉비즈타워", "보타닉비즈타워")
-    text = text.replace("마곡나루역 프라이빗타워 1", "안강1")
-    text = text.replace("마곡엠밸리7단지", "엠밸리7단지")
-    text = text.replace("외 2필지 델타빌딩", "델타빌딩")
-    text = text.replace("외 1필지 엔에이치서울축산농협엔에이치서울타워", "NH서울타워")
-    text = text.replace("지엠지엘스타", "GMG엘스타")
-    text = text.replace("케이스퀘어마곡업무시설", "케이스퀘어")
-    text = text.replace("르웨스트시티 제본동", "르웨스트시티")
-    text = text.replace("보타닉게이트마곡디38지식산업센터", "보타닉게이트")
-    text = text.replace("외 3필지 마곡아이파크디어반", "아이파크디어반")
-    text = text.replace("쿠쿠마곡빌딩", "쿠쿠빌딩")
-    text = text.replace("마곡보타닉파크프라자를", "보타닉파크프라자")
-    text = text.replace("마곡보타닉파크프라자", "보타닉파크프라자")
-
-    # 보타닉파크타워 1/2/3 -> 보타닉파크1/2/3 (TXT/엑셀/DB 매칭 통일)
-    text = re.sub(r"마곡보타닉파크타워\s*([123])\s*차?", r"보타닉파크\1", text)
-    text = re.sub(r"보타닉파크\s*타워\s*([123])\s*차?", r"보타닉파크\1", text)
-    text = re.sub(r"보타닉파크타워\s*([123])\s*차?", r"보타닉파크\1", text)
-    text = re.sub(r"보타닉파크\s*([123])\s*차", r"보타닉파크\1", text)
-
-    text = text.replace("엘케이빌딩", "LK빌딩")
-    text = text.replace("에스에이치빌딩", "SH빌딩")
-    text = text.replace("외 1필지 우림 블루나인 비즈니스센터", "우림블루나인")
-    text = text.replace("지상", "")
-
-    # ✅ 리더스애비뉴 표기 통일 (애비뉴/에비뉴 + 마곡)
-    text = text.replace("리더스애비뉴마곡", "리더스애비뉴")
-    text = text.replace("리더스애비뉴 마곡", "리더스애비뉴")
-    text = text.replace("리더스에비뉴", "리더스애비뉴")
-
-    # ✅ 퀸즈파크 숫자 표기 통일 (공백/차 유무)
-    text = re.sub(r"퀸즈파크\s*9(?:차)?", "퀸즈9", text)
-    text = re.sub(r"퀸즈파크\s*10(?:차)?", "퀸즈10", text)
-    text = re.sub(r"퀸즈파크\s*11(?:차)?", "퀸즈11", text)
-    text = re.sub(r"퀸즈파크\s*12(?:차)?", "퀸즈12", text)
-    text = re.sub(r"퀸즈파크\s*13(?:차)?", "퀸즈13", text)
-
-    return text
+    refresh_alias_table()
+    return _BUILDING_MATCHER.apply(text)
 
 def clean_building_name(raw):
-    text = str(raw).strip()
+    # 별칭 규칙 파일이 바뀌었으면 여기서 캐시까지 비워짐
+    refresh_alias_table()
+    return _clean_building_name_cached(str(raw))
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def _clean_building_name_cached(text):
+    text = text.strip()
 
     # ✅ '일부/전체' 같은 구분 단어는 살려야 합니다. (층/일부/전체가 사라지면 웰튼병원 분류가 무너짐)
     remove_words = [
@@ -588,8 +935,7 @@ def clean_building_name(raw):
     # 제944호 -> 944호
     text = re.sub(r"제\s*(\d+호)", r"\1", text)
 
-    text = normalize_dong(text)
-    text = normalize_building_custom(text)
+    text = _ALIAS_MATCHER.apply(text)
 
     # 🔥 퀸즈 9, 10, 11 동(A,B,C) 철벽 방어 및 층수별 상가/사무실 자동 할당 로직
     if "퀸즈" in text:
@@ -649,6 +995,128 @@ def clean_building_name(raw):
     text = " ".join(text.split())
     return text.strip()
 
+
+ALIAS_RELOAD_HOOKS.append(_clean_building_name_cached.cache_clear)
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def station_for_building(building_name):
+    """
+    건물명 → 가까운 역 (LOCATION_MAPPING)
+    - 원본 건물명과 정규화된 건물명 둘 다에서 찾고, 여러 역에 걸리면 가장 길게 일치한 건물의 역
+      (예: '사이언스타워2' 는 발산역 '사이언스타' 보다 마곡역 '사이언스타워2' 가 우선)
+    """
+    if not building_name:
+        return None
+
+    names = (str(building_name).upper(), clean_building_name(building_name).upper())
+    best_station, best_len = None, 0
+    for station, buildings in LOCATION_MAPPING.items():
+        for b in buildings:
+            key = b.upper()
+            if len(key) > best_len and any(key in n for n in names):
+                best_station, best_len = station, len(key)
+    return best_station
+
+
+ALIAS_RELOAD_HOOKS.append(station_for_building.cache_clear)
+
+
+STATION_BACKFILL_BATCH = 500  # 한 번에 커밋할 행 수 (쓰기 잠금을 짧게)
+_STATION_REFRESH_LOCK = threading.Lock()
+
+
+def backfill_station(only_missing=True):
+    """
+    기존 매물의 station 컬럼 채우기 (only_missing=False 면 역 분류가 바뀐 뒤 전체 재계산)
+    STATION_BACKFILL_BATCH 행마다 커밋 → 큰 테이블에서도 다른 워커의 쓰기가 오래 막히지 않음
+    """
+    query = db.session.query(Property.id, Property.building_name, Property.station)
+    if only_missing:
+        query = query.filter(Property.station.is_(None))
+
+    changes = []
+    for pid, b_name, old_station in query:
+        station = station_for_building(b_name)
+        if station != old_station:
+            changes.append({"id": pid, "station": station})
+    db.session.commit()  # 읽기 트랜잭션 종료
+
+    for rows in _chunks(changes, STATION_BACKFILL_BATCH):
+        db.session.execute(update(Property), rows)
+        db.session.commit()
+    return len(changes)
+
+
+def refresh_station_for_alias(digest, take_over=False):
+    """
+    별칭 파일 해시 digest 기준 station 전체 재계산 (사이트 전체에서 맡은 워커 하나만) → 재계산했으면 True
+    - app_meta 에 'pending:<해시>' 를 먼저 적은 워커가 맡고, 다 끝나면 '<해시>' 로 바꿈
+    - 맡은 워커가 중간에 죽어서 pending 으로 남은 경우는 서버 시작 때(take_over=True) 다시 맡음
+    """
+    pending = f"pending:{digest}"
+    condition = "value IS NOT :digest" if take_over else "value IS NOT :digest AND value IS NOT :pending"
+    claimed = db.session.execute(db.text(
+        f"UPDATE app_meta SET value = :pending WHERE key = 'station_alias_digest' AND {condition}"
+    ), {"digest": digest, "pending": pending}).rowcount
+    db.session.commit()
+    if not claimed:
+        return False
+
+    backfill_station(only_missing=False)
+    db.session.execute(db.text(
+        "UPDATE app_meta SET value = :digest WHERE key = 'station_alias_digest' AND value = :pending"
+    ), {"digest": digest, "pending": pending})
+    db.session.commit()
+    return True
+
+
+def _refresh_station_in_background(digest):
+    try:
+        with app.app_context():
+            refresh_station_for_alias(digest)
+    except Exception as e:
+        print(f"station 재계산 실패: {e}")
+        ALIAS_STATE["station_digest"] = None  # 다음 목록 요청 때 다시 시도
+    finally:
+        with _STATION_REFRESH_LOCK:
+            ALIAS_STATE["station_refreshing"] = None
+
+
+def ensure_station_fresh():
+    """
+    별칭 파일이 바뀌었으면 station 전체 재계산을 백그라운드 스레드에 맡김 (목록 요청은 기다리지 않음)
+    - 역 분류뿐 아니라 동/건물 규칙이 바뀌어도 정규화된 건물명이 달라지므로 파일 전체 해시로 비교
+    - 재계산이 끝날 때까지는 이전 station 값으로 필터 (잠깐 동안만 예전 분류)
+    """
+    refresh_alias_table()
+    digest = ALIAS_STATE.get("digest")
+    if not digest or ALIAS_STATE.get("station_digest") == digest:
+        return
+
+    with _STATION_REFRESH_LOCK:
+        if ALIAS_STATE.get("station_refreshing") == digest:
+            return
+        ALIAS_STATE.update(station_refreshing=digest, station_digest=digest)
+    threading.Thread(target=_refresh_station_in_background, args=(digest,), name="station-refresh", daemon=True).start()
+
+
+@app.cli.command("backfill-station")
+def backfill_station_command():
+    """flask backfill-station : 모든 매물의 가까운 역 다시 계산"""
+    print(f"station 갱신: {backfill_station(only_missing=False)}건")
+
+
+# ✅ 서버 시작 시 station 이 비어있는 기존 매물 채우기 (+ 별칭 파일이 바뀐 채로 재시작했으면 전체 재계산)
+#    요청을 받기 전이라 여기서는 끝날 때까지 기다림
+with app.app_context():
+    backfill_station()
+    if ALIAS_STATE.get("digest"):
+        refresh_station_for_alias(ALIAS_STATE["digest"], take_over=True)
+        ALIAS_STATE["station_digest"] = ALIAS_STATE["digest"]
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
 def trim_after_last_ho(line: str) -> str:
     """
     건물명 라인에서 마지막 '호'까지만 남기고 뒤 텍스트 제거
@@ -802,32 +1270,440 @@ def login():
 
 
 
-@app.route("/")
-@login_required
-def index():
+def text_contains(column_name, keyword):
+    """
+    건물명/비공개메모 부분 일치 조건
+    - 3글자 이상이면 FTS5 trigram 인덱스로 찾음 (LIKE 와 같은 결과, 전체 스캔 없음)
+    - 1~2글자는 trigram 을 만들 수 없어서 기존 LIKE 그대로
+    """
+    pattern = f"%{keyword}%"
+    if not FTS_ENABLED or len(keyword) < 3:
+        return getattr(Property, column_name).like(pattern)
+    return Property.id.in_(
+        select(property_fts.c.rowid).where(property_fts.c[column_name].like(pattern))
+    )
+
+
+def collection_pairs_for(property_ids):
+    """현재 페이지 매물들이 담긴 (property_id, collection_id) 쌍만 조회 ('이미 담김' 표시용)"""
+    if not property_ids:
+        return set()
+    rows = db.session.query(CollectionItem.property_id, CollectionItem.collection_id).filter(
+        CollectionItem.property_id.in_(property_ids)
+    )
+    return set(tuple(r) for r in rows)
+
+
+def thumb_map_for(property_ids, per_property=2):
+    """
+    매물 id 목록 → {property_id: [최신 사진 N장의 카드용 주소]}
+    ROW_NUMBER() 윈도우 함수로 매물별 최신 N장만 가져옴 (사진 전체를 읽지 않음)
+    """
+    thumb_map = {}
+    if not property_ids:
+        return thumb_map
+
+    rn = func.row_number().over(
+        partition_by=PropertyImage.property_id,
+        order_by=PropertyImage.id.desc()
+    ).label("rn")
+    ranked = db.session.query(
+        PropertyImage.id, PropertyImage.property_id, PropertyImage.file_path, rn
+    ).filter(PropertyImage.property_id.in_(property_ids)).subquery()
+
+    rows = db.session.query(ranked.c.property_id, ranked.c.file_path).filter(
+        ranked.c.rn <= per_property
+    ).order_by(ranked.c.property_id, ranked.c.id.desc())
+
+    # ✅ 카드에는 원본 대신 작은 사진(PHOTO_CARD_SIZE)
+    for property_id, file_path in rows:
+        thumb_map.setdefault(property_id, []).append(photo_variant_url(file_path, PHOTO_CARD_SIZE))
+    return thumb_map
+
+
+def index_sort_keys(args):
+    """index() 정렬 기준 [(컬럼, 내림차순 여부), ...] (커서 페이지도 같은 기준으로 이어서 읽음)"""
+    mode = args.get("mode", "rent")
+    sort = args.get("sort", "")
+
+    if sort == "rent_asc":
+        return [(Property.rent, False), (Property.deposit, False)]
+    elif sort == "rent_desc":
+        return [(Property.rent, True), (Property.deposit, True)]
+    elif sort == "sale_asc":
+        return [(Property.sale_price, False)]
+    elif sort == "sale_desc":
+        return [(Property.sale_price, True)]
+    elif sort == "area_asc":
+        return [(Property.exclusive_area, False)]
+    elif sort == "area_desc":
+        return [(Property.exclusive_area, True)]
+
+    # 기본 정렬
+    if mode == "rent":
+        return [(Property.rent, False), (Property.deposit, False)]
+    return [(Property.sale_price, False)]
+
+
+def search_sort_keys(args):
+    """search() 정렬 기준 [(컬럼, 내림차순 여부), ...] (정렬 선택이 없으면 빈 목록)"""
+    sort = args.get("sort", "")
+
+    # 거래구분이 하나만 선택됐으면 '월세/매매 먼저' CASE 는 항상 같은 값 → 빼야 복합 인덱스 순서를 그대로 씀
+    single_category = len(set(args.getlist("category"))) == 1
+    rent_first = [] if single_category else [(case((Property.category == "월세", 0), else_=1), False)]
+    sale_first = [] if single_category else [(case((Property.category == "매매", 0), else_=1), False)]
+
+    if sort == "rent_asc":
+        return rent_first + [(Property.rent, False)]
+    elif sort == "rent_desc":
+        return rent_first + [(Property.rent, True)]
+    elif sort == "sale_asc":
+        return sale_first + [(Property.sale_price, False)]
+    elif sort == "sale_desc":
+        return sale_first + [(Property.sale_price, True)]
+    elif sort == "area_asc":
+        return [(Property.exclusive_area, False)]
+    elif sort == "area_desc":
+        return [(Property.exclusive_area, True)]
+    return []
+
+
+def sort_clauses(keys):
+    return [expr.desc() if descending else expr.asc() for expr, descending in keys]
+
+
+# ✅ 목록/검색 결과 캐시 (필터/정렬/페이지 → 그 페이지 매물 id 목록 + 전체 개수)
+#    별도 SQLite 파일에 저장 → gunicorn 워커끼리 공유
+#    키에 데이터 세대 번호(data_generation)가 들어가서 매물이 바뀌면 이전 결과는 자동으로 안 맞음
+#    키에 DB 고유값(app_meta.db_identity)도 들어가서 DB 를 새로 만들면(세대 번호가 다시 0부터) 이전 결과는 안 맞음
+#    백업에서 되돌린 DB(같은 고유값, 세대 번호가 캐시보다 작음)는 서버 시작 때 캐시를 비움 (sync)
+app.config.setdefault("QUERY_CACHE_PATH", os.environ.get("QUERY_CACHE_PATH", os.path.join(app.instance_path, "query_cache.db")))
+QUERY_CACHE_MAX_ENTRIES = 2000
+
+
+class QueryResultCache:
+    def __init__(self, path, max_entries=QUERY_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._sets = 0
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS query_cache ("
+                "key TEXT PRIMARY KEY, generation INTEGER, payload TEXT, created_at REAL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        try:
+            row = self._conn().execute("SELECT payload FROM query_cache WHERE key = ?", (key[0],)).fetchone()
+        except sqlite3.Error as e:
+            print(f"결과 캐시 읽기 실패: {e}")
+            row = None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, payload):
+        digest, generation = key
+        try:
+            conn = self._conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO query_cache (key, generation, payload, created_at) VALUES (?, ?, ?, ?)",
+                (digest, generation, json.dumps(payload, separators=(",", ":")), time.time()),
+            )
+            self._sets += 1
+            if self._sets % 100 == 0:
+                self.prune(generation)
+        except sqlite3.Error as e:
+            print(f"결과 캐시 저장 실패: {e}")
+
+    def prune(self, generation):
+        """지난 세대 결과 삭제 + 개수 상한 넘으면 오래된 것부터 삭제"""
+        conn = self._conn()
+        conn.execute("DELETE FROM query_cache WHERE generation < ?", (generation,))
+        conn.execute(
+            "DELETE FROM query_cache WHERE key IN ("
+            "SELECT key FROM query_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def sync(self, identity, generation):
+        """다른 DB 용이거나 지금 DB 보다 앞선 세대의 결과가 있으면 캐시 전체 삭제 → 삭제했으면 True"""
+        try:
+            conn = self._conn()
+            conn.execute("CREATE TABLE IF NOT EXISTS query_cache_meta (key TEXT PRIMARY KEY, value TEXT)")
+            row = conn.execute("SELECT value FROM query_cache_meta WHERE key = 'db_identity'").fetchone()
+            newest = conn.execute("SELECT MAX(generation) FROM query_cache").fetchone()[0]
+            stale = (row is not None and row[0] != identity) or (newest is not None and newest > generation)
+            if stale:
+                conn.execute("DELETE FROM query_cache")
+            conn.execute("INSERT OR REPLACE INTO query_cache_meta (key, value) VALUES ('db_identity', ?)", (identity,))
+            return stale
+        except sqlite3.Error as e:
+            print(f"결과 캐시 확인 실패: {e}")
+            return False
+
+    def stats(self):
+        try:
+            size = self._conn().execute("SELECT COUNT(*) FROM query_cache").fetchone()[0]
+        except sqlite3.Error:
+            size = None
+        return {"hits": self.hits, "misses": self.misses, "size": size, "max_entries": self.max_entries}
+
+
+QUERY_CACHE = QueryResultCache(app.config["QUERY_CACHE_PATH"])
+
+
+def current_data_generation():
+    return db.session.execute(db.text("SELECT value FROM data_generation WHERE id = 1")).scalar() or 0
+
+
+def current_db_identity():
+    return db.session.execute(db.text("SELECT value FROM app_meta WHERE key = 'db_identity'")).scalar() or ""
+
+
+# ✅ 매물(property)이 바뀌면 같은 트랜잭션 안에서 데이터 세대 번호 +1
+#    ORM 저장(flush) 과 대량 insert/update/delete 문 둘 다 잡아서 → 카톡 등록, 메모 API, 삭제 등 모든 쓰기 경로에 적용
+#    (행마다 트리거를 돌리지 않고 flush/문장 한 번에 한 번만 올림)
+BUMP_GENERATION_SQL = db.text("UPDATE data_generation SET value = value + 1 WHERE id = 1")
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_generation_after_flush(session, flush_context):
+    changed = itertools.chain(session.new, session.deleted, (o for o in session.dirty if session.is_modified(o)))
+    if any(isinstance(o, Property) for o in changed):
+        session.execute(BUMP_GENERATION_SQL)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _bump_generation_on_bulk(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and mapper.class_ is Property:
+            orm_execute_state.session.execute(BUMP_GENERATION_SQL)
+
+
+# ✅ 서버 시작 시: 캐시 파일이 다른 DB / 백업에서 되돌리기 전 DB 의 결과면 비움
+with app.app_context():
+    if QUERY_CACHE.sync(current_db_identity(), current_data_generation()):
+        print("목록 결과 캐시 비움 (DB 가 바뀜)")
+
+
+def listing_cache_key(per_page, cursor):
+    """
+    (정규화된 화면/필터/정렬/페이지 + DB 고유값 → sha1, 데이터 세대) 캐시 키
+    - 빈 값 파라미터, 값 순서 차이, fields(응답 모양만 바꿈) 는 같은 결과로 봄
+    - 역 목록(LOCATION_MAPPING) 이 바뀐 경우도 별도 키가 되도록 별칭 파일 시각 포함
+    """
+    params = sorted(
+        (k, v.strip()) for k, v in request.args.items(multi=True)
+        if v.strip() and k not in ("page", "cursor", "fields", "per_page")
+    )
+    position = ["cursor", cursor] if cursor is not None else ["page", request.args.get('page', 1, type=int)]
+    identity, generation = db.session.execute(db.text(
+        "SELECT (SELECT value FROM app_meta WHERE key = 'db_identity'), (SELECT value FROM data_generation WHERE id = 1)"
+    )).one()
+    generation = generation or 0
+    raw = json.dumps([identity, request.endpoint, per_page, position, params, ALIAS_STATE.get("mtime")], ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest() + f":{generation}", generation
+
+
+def _strictly_after(keys, values):
+    """정렬 순서상 커서 값 (v1, v2, ...) 보다 뒤에 오는 행 조건 (SQLite: NULL 은 ASC 맨 앞, DESC 맨 뒤)"""
+    (expr, descending), value = keys[0], values[0]
+    if value is None:
+        after = None if descending else expr.isnot(None)
+        tie = expr.is_(None)
+    else:
+        after = or_(expr < value, expr.is_(None)) if descending else expr > value
+        tie = expr == value
+    if len(keys) > 1:
+        tie_rest = and_(tie, _strictly_after(keys[1:], values[1:]))
+        return tie_rest if after is None else or_(after, tie_rest)
+    return after if after is not None else false()
+
+
+def _keyset_segments(keys, values):
+    """
+    커서 다음 행들을 정렬 순서대로 나눈 조건 목록
+    첫 정렬 컬럼을 범위/동등 조건으로 걸어야 인덱스에서 커서 위치로 바로 찾아감 (OR IS NULL 은 범위로 못 씀)
+    """
+    (expr, descending), value = keys[0], values[0]
+    if len(keys) == 1:
+        return [_strictly_after(keys, values)]
+    rest = _strictly_after(keys[1:], values[1:])
+    if value is None:
+        # NULL 구간 안에서 이어 읽기 → (ASC 면) NULL 이 아닌 나머지 전부
+        segments = [and_(expr.is_(None), rest)]
+        if not descending:
+            segments.append(expr.isnot(None))
+        return segments
+    if descending:
+        # 값이 있는 구간을 끝까지 읽은 다음 NULL 구간
+        return [and_(expr <= value, or_(expr < value, and_(expr == value, rest))), expr.is_(None)]
+    return [and_(expr >= value, or_(expr > value, and_(expr == value, rest)))]
+
+
+def _encode_cursor(state):
+    raw = json.dumps(state, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        state = json.loads(raw.decode("utf-8"))
+        return state if isinstance(state, dict) and isinstance(state.get("a"), list) else None
+    except Exception:
+        return None
+
+
+class KeysetPagination:
+    """
+    커서(seek) 방식 페이지 (모바일 무한 스크롤)
+    - OFFSET 없이 '마지막으로 본 정렬값 + id' 다음부터 읽어서 몇 번째 묶음이든 첫 페이지와 같은 비용
+    - 전체 개수는 첫 묶음에서만 세고, 이후 커서에 담아서 다음 요청으로 넘김 (다음 묶음에서는 COUNT 안 함)
+    """
+    is_keyset = True
+    has_prev = False
+
+    def __init__(self, query, keys, cursor, per_page, scope="", cached=None):
+        # 같은 값이 여러 개여도 순서가 고정되도록 id 를 마지막 정렬 기준으로 추가 (방향은 마지막 컬럼과 같게 → 인덱스 순서 그대로)
+        keys = list(keys) + [(Property.id, keys[-1][1] if keys else False)]
+        # 다른 필터/정렬에서 만든 커서면 첫 묶음부터 다시
+        state = _decode_cursor(cursor)
+        if state and (state.get("s") != scope or len(state["a"]) != len(keys)):
+            state = None
+
+        self._count_query = query.order_by(None)
+        self._total = state.get("t") if state else None
+        self.per_page = per_page
+        self.scope = scope
+        self.next_url = None
+
+        if cached is not None:
+            # 결과 캐시 적중 → 페이지 매물만 id 로 다시 읽음
+            self.items = rows_by_ids(query, cached["ids"])
+            self.has_next = cached["has_next"]
+            self._last_values = cached["last"]
+            if cached["total"] is not None:
+                self._total = cached["total"]
+            return
+
+        ordered = query.order_by(None).order_by(*sort_clauses(keys)).add_columns(*[expr for expr, _ in keys])
+        segments = _keyset_segments(keys, state["a"]) if state else [None]
+
+        rows = []
+        for condition in segments:
+            need = per_page + 1 - len(rows)
+            if need <= 0:
+                break
+            segment_query = ordered if condition is None else ordered.filter(condition)
+            rows.extend(segment_query.limit(need).all())
+
+        self.has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        self.items = [row[0] for row in rows]
+        self._last_values = list(rows[-1][1:]) if rows else None
+
+    @property
+    def total(self):
+        if self._total is None:
+            self._total = self._count_query.count()
+        return self._total
+
+    @property
+    def next_cursor(self):
+        if not self.has_next:
+            return None
+        return _encode_cursor({"a": self._last_values, "t": self.total, "s": self.scope})
+
+    def cache_payload(self):
+        # 개수는 이미 센 경우(첫 묶음 / 커서에 담겨 온 값)만 저장 → 캐시 저장 때문에 COUNT 를 돌리지 않음
+        return {"ids": [p.id for p in self.items], "has_next": self.has_next, "last": self._last_values, "total": self._total}
+
+
+class CachedPagination(Pagination):
+    """결과 캐시에 저장해 둔 페이지 (query.paginate() 결과와 같은 모양으로 템플릿에서 그대로 씀)"""
+
+    def _query_items(self):
+        return self._query_args["items"]
+
+    def _query_count(self):
+        return self._query_args["total"]
+
+
+def rows_by_ids(query, ids):
+    """캐시해 둔 id 순서 그대로 매물 다시 읽기 (같은 쿼리 옵션/필터 유지, PK 조회라 빠름)"""
+    if not ids:
+        return []
+    by_id = {p.id: p for p in query.order_by(None).filter(Property.id.in_(ids))}
+    return [by_id[i] for i in ids if i in by_id]
+
+
+def listing_page(query, keys, per_page, default_cursor=None):
+    """page= 번호 페이지(기본) 또는 cursor= 가 있으면 커서 페이지 (cursor= 빈값이면 첫 묶음)"""
+    cursor = request.args.get("cursor", default_cursor)
+    cache_key = listing_cache_key(per_page, cursor)
+    cached = QUERY_CACHE.get(cache_key)
+
+    if cursor is None:
+        page = request.args.get('page', 1, type=int)
+        if cached is not None:
+            items = rows_by_ids(query, cached["ids"])
+            return CachedPagination(page=page, per_page=per_page, error_out=False, items=items, total=cached["total"])
+        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        QUERY_CACHE.set(cache_key, {"ids": [p.id for p in pagination.items], "total": pagination.total})
+        return pagination
+
+    # 커서는 만들어진 필터/정렬 조건에서만 유효
+    filters = sorted((k, v) for k, v in request.args.items(multi=True) if k not in ("cursor", "page", "fields"))
+    scope = hashlib.sha1(json.dumps(filters, ensure_ascii=False).encode("utf-8")).hexdigest()[:10]
+
+    pagination = KeysetPagination(query, keys, cursor, per_page, scope=scope, cached=cached)
+    if cached is None:
+        QUERY_CACHE.set(cache_key, pagination.cache_payload())
+    if pagination.has_next:
+        args = request.args.to_dict(flat=False)
+        args.pop("page", None)
+        args["cursor"] = pagination.next_cursor
+        pagination.next_url = url_for(request.endpoint, **args)
+    return pagination
+
+
+def build_index_query(args):
+    """index() 목록 쿼리 (필터 + 정렬). 쿼리플랜 점검도 같은 함수로 만든 쿼리를 씀"""
     # 1. [가장 중요] query 변수를 먼저 생성합니다. (에러 해결 핵심)
     query = Property.query 
 
     # 2. 필터 조건들 가져오기
-    mode = request.args.get("mode", "rent")
-    sort = request.args.get("sort", "")
-    property_types = [pt for pt in request.args.getlist("property_type") if pt]
-    property_type = request.args.get("property_type", "").strip() 
-    locations = request.args.getlist('location') # 체크박스로 선택된 역 목록
+    mode = args.get("mode", "rent")
+    property_types = [pt for pt in args.getlist("property_type") if pt]
+    locations = args.getlist('location') # 체크박스로 선택된 역 목록
 
-    # 3. 위치(역) 체크박스 필터링 적용
+    # 3. 위치(역) 체크박스 필터링 적용 (등록 시 계산해둔 station 컬럼 → 인덱스 IN 조회)
     if locations:
-        location_conditions = []
-        for loc in locations:
-            if loc in LOCATION_MAPPING:
-                buildings = LOCATION_MAPPING[loc]
-                for b in buildings:
-                    # 선택된 역에 해당하는 건물명이 포함된 경우를 모두 찾음
-                    location_conditions.append(Property.building_name.contains(b))
-        
-        # 여러 역 중 하나라도 해당되면 표시 (OR 조건)
-        if location_conditions:
-            query = query.filter(or_(*location_conditions))
+        ensure_station_fresh()
+        stations = [loc for loc in locations if loc in LOCATION_MAPPING]
+
+        # 여러 역 중 하나라도 해당되면 표시
+        if stations:
+            query = query.filter(Property.station.in_(stations))
 
     # 4. 매물 종류(상가/사무실 등) 필터링
     if property_types:
@@ -840,43 +1716,191 @@ def index():
         query = query.filter_by(category="월세")
 
     # 6. 정렬 로직 적용
-    if sort == "rent_asc":
-        query = query.order_by(Property.rent.asc(), Property.deposit.asc())
-    elif sort == "rent_desc":
-        query = query.order_by(Property.rent.desc(), Property.deposit.desc())
-    elif sort == "sale_asc":
-        query = query.order_by(Property.sale_price.asc())
-    elif sort == "sale_desc":
-        query = query.order_by(Property.sale_price.desc())
-    elif sort == "area_asc":
-        query = query.order_by(Property.exclusive_area.asc())
-    elif sort == "area_desc":
-        query = query.order_by(Property.exclusive_area.desc())
-    else:
-        # 기본 정렬
-        if mode == "rent":
-            query = query.order_by(Property.rent.asc(), Property.deposit.asc())
-        else:
-            query = query.order_by(Property.sale_price.asc())
+    query = query.order_by(*sort_clauses(index_sort_keys(args)))
+
+    return query
+
+
+def build_search_query(args):
+    """search() 검색 쿼리 (필터 + 정렬). 쿼리플랜 점검도 같은 함수로 만든 쿼리를 씀"""
+    query = Property.query
+
+    building = args.get("building", "")
+    memo = args.get("memo", "").strip()
+    categories = args.getlist("category")
+    property_types = [pt for pt in args.getlist("property_type") if pt]  # 빈값 제거
+    locations = args.getlist("location") # ✅ 체크박스로 선택된 역 목록 가져오기
+    
+    opt_interior = args.get("opt_interior", "")
+    opt_gonghang = args.get("opt_gonghang", "")
+    opt_corner = args.get("opt_corner", "")
+
+    # 숫자가 아닌 값(?min_rent=abc 등)은 per_page 처럼 그 조건만 무시 (None)
+    min_deposit = args.get("min_deposit", type=int)
+    max_deposit = args.get("max_deposit", type=int)
+    min_rent = args.get("min_rent", type=int)
+    max_rent = args.get("max_rent", type=int)
+    min_area = args.get("min_area", type=float)
+    max_area = args.get("max_area", type=float)
+    min_sale = args.get("min_sale", type=int)
+    max_sale = args.get("max_sale", type=int)
+
+    # 1. 건물명 직접 검색 / 비공개메모 키워드 검색
+    if building:
+        query = query.filter(text_contains("building_name", building))
+    if memo:
+        query = query.filter(text_contains("private_memo", memo))
+
+    # 2. ✅ 위치(역) 체크박스 필터링 적용 (등록 시 계산해둔 station 컬럼 → 인덱스 IN 조회)
+    if locations:
+        ensure_station_fresh()
+        stations = [loc for loc in locations if loc in LOCATION_MAPPING]
+
+        # 선택된 역의 건물 중 하나라도 일치하면 검색 결과에 포함
+        if stations:
+            query = query.filter(Property.station.in_(stations))
+
+    # 3. 매물종류(상가/사무실) 필터링
+    if property_types:
+        query = query.filter(Property.property_type.in_(property_types))
+
+    # 4. 거래구분(매매/월세) 필터링
+    if categories:
+        query = query.filter(Property.category.in_(categories))
+
+    # 5. 금액 조건 필터링
+    if min_deposit is not None:
+        query = query.filter(Property.deposit >= min_deposit)
+    if max_deposit is not None:
+        query = query.filter(Property.deposit <= max_deposit)
+
+    if min_rent is not None:
+        query = query.filter(Property.rent >= min_rent)
+    if max_rent is not None:
+        query = query.filter(Property.rent <= max_rent)
+
+    if min_sale is not None:
+        query = query.filter(Property.sale_price >= min_sale)
+    if max_sale is not None:
+        query = query.filter(Property.sale_price <= max_sale)
+
+    if min_area is not None:
+        query = query.filter(Property.exclusive_area >= min_area)
+    if max_area is not None:
+        query = query.filter(Property.exclusive_area <= max_area)
+
+    # 6. 옵션(인테리어, 코너 등) 필터링
+    if opt_interior == "on":
+        query = query.filter(Property.has_interior == True)
+    if opt_gonghang == "on":
+        query = query.filter(Property.has_gonghang == True)
+    if opt_corner == "on":
+        query = query.filter(Property.has_corner == True)    
+
+    # 7. 정렬 로직
+    query = query.order_by(*sort_clauses(search_sort_keys(args)))
+
+    return query
+
+
+# ✅ 목록/검색의 대표 조회 모양 → 인덱스 없이 풀스캔하거나 정렬용 임시 B-tree 를 만들면 실패
+#    필터/정렬을 새로 추가하면 여기에도 한 줄 추가하고 `flask check-query-plans` 로 확인
+QUERY_PLAN_SHAPES = [
+    ("index", {"mode": "rent"}),
+    ("index", {"mode": "rent", "sort": "rent_desc"}),
+    ("index", {"mode": "sale"}),
+    ("index", {"mode": "sale", "sort": "sale_desc"}),
+    ("index", {"mode": "rent", "sort": "area_asc"}),
+    ("index", {"mode": "rent", "property_type": "사무실"}),
+    ("index", {"mode": "rent", "property_type": "상가", "sort": "rent_desc"}),
+    ("index", {"mode": "sale", "property_type": "상가", "sort": "area_desc"}),
+    ("search", {"category": "월세", "sort": "rent_asc"}),
+    ("search", {"category": "월세", "min_rent": "100", "max_rent": "300", "sort": "rent_asc"}),
+    ("search", {"category": "월세", "min_deposit": "1000", "sort": "rent_desc"}),
+    ("search", {"category": "매매", "max_sale": "100000", "sort": "sale_desc"}),
+    ("search", {"category": "월세", "property_type": "사무실", "min_area": "30", "sort": "area_asc"}),
+    ("search", {"category": "매매", "property_type": "상가", "sort": "sale_asc"}),
+    ("search", {"min_area": "30", "max_area": "60", "sort": "area_asc"}),
+    ("search", [("location", "마곡역"), ("category", "월세"), ("sort", "rent_asc")]),
+    ("search", [("location", "마곡역"), ("location", "발산역"), ("category", "매매"), ("sort", "sale_desc")]),
+]
+
+# ✅ 알고도 두는 예외: (화면, 조건, 허용하는 문제, 이유) — 허용한 것 말고 다른 문제가 생기면 실패
+QUERY_PLAN_KNOWN_EXCEPTIONS = [
+    ("search", [("category", "월세"), ("category", "매매"), ("sort", "rent_asc")], {"temp_btree"},
+     "거래구분 여러 개 + 금액 정렬은 '월세/매매 먼저' CASE 가 정렬 첫 키라 인덱스 순서로 못 읽음"),
+    ("search", [("category", "월세"), ("category", "매매"), ("sort", "sale_desc")], {"temp_btree"},
+     "위와 같음 (매매 먼저)"),
+    ("search", {"sort": "rent_asc"}, {"full_scan", "temp_btree"},
+     "필터 없는 전체 정렬: 어차피 전체를 읽고, CASE 정렬 키라 인덱스 순서로 못 읽음"),
+    ("search", [("location", "마곡역"), ("sort", "rent_asc")], {"temp_btree"},
+     "역 필터만 있으면 station 인덱스로 좁힌 뒤 정렬 (역 하나의 매물 수만큼만 정렬)"),
+    ("search", [("location", "마곡역"), ("sort", "area_asc")], {"temp_btree"},
+     "위와 같음"),
+]
+
+
+def explain_query_plan(query):
+    """ORM 쿼리의 EXPLAIN QUERY PLAN 결과(detail 문자열 목록)"""
+    compiled = query.statement.compile(db.engine, compile_kwargs={"literal_binds": True})
+    rows = db.session.execute(db.text(f"EXPLAIN QUERY PLAN {compiled}")).all()
+    return [row[-1] for row in rows]
+
+
+def query_plan_issues(plan):
+    """쿼리플랜 → {"full_scan", "temp_btree"} 중 해당하는 것"""
+    issues = set()
+    for detail in plan:
+        if detail.startswith("SCAN property") and "INDEX" not in detail:
+            issues.add("full_scan")
+        if "TEMP B-TREE FOR ORDER BY" in detail:
+            issues.add("temp_btree")
+    return issues
+
+
+def query_plan_problems():
+    shapes = [(view, params, set()) for view, params in QUERY_PLAN_SHAPES]
+    shapes += [(view, params, allowed) for view, params, allowed, _ in QUERY_PLAN_KNOWN_EXCEPTIONS]
+
+    problems = []
+    for view, params, allowed in shapes:
+        builder = build_index_query if view == "index" else build_search_query
+        plan = explain_query_plan(builder(MultiDict(params)))
+        if query_plan_issues(plan) - allowed:
+            problems.append(f"{view} {params}: {' / '.join(plan)}")
+    return problems
+
+
+@app.cli.command("check-query-plans")
+def check_query_plans_command():
+    """flask check-query-plans : 목록/검색 대표 조회가 인덱스를 타는지 점검 (실패 시 종료코드 1)"""
+    problems = query_plan_problems()
+    for problem in problems:
+        print(f"❌ {problem}")
+    if problems:
+        raise SystemExit(1)
+    print(f"쿼리플랜 OK ({len(QUERY_PLAN_SHAPES)}개 조회 모양, 알려진 예외 {len(QUERY_PLAN_KNOWN_EXCEPTIONS)}개)")
+
+
+@app.route("/")
+@login_required
+def index():
+    mode = request.args.get("mode", "rent")
+    property_type = request.args.get("property_type", "").strip() 
+    query = build_index_query(request.args)
 
-    # 7. 페이지 나누기 (20개씩)
-    page = request.args.get('page', 1, type=int)
-    pagination = query.paginate(page=page, per_page=20, error_out=False)
+    # 7. 페이지 나누기 (20개씩, cursor= 가 오면 커서 방식)
+    pagination = listing_page(query, index_sort_keys(request.args), per_page=20)
     properties = pagination.items
 
     # 8. 화면 표시용 추가 데이터 준비
     last_upload = UploadLog.query.order_by(UploadLog.id.desc()).first()
     upload_time = last_upload.upload_time if last_upload else "업로드 기록 없음"
     collections = Collection.query.all()
-    existing_pairs = set((item.property_id, item.collection_id) for item in CollectionItem.query.all())
+    existing_pairs = collection_pairs_for([p.id for p in properties])
 
-    # 9. 카드 미리보기용 최신 사진 2장 매칭
-    thumb_map = {}
-    for img in PropertyImage.query.order_by(PropertyImage.id.desc()).all():
-        if img.property_id not in thumb_map:
-            thumb_map[img.property_id] = []
-        if len(thumb_map[img.property_id]) < 2:
-            thumb_map[img.property_id].append(img.file_path)
+    # 9. 카드 미리보기용 최신 사진 2장 매칭 (현재 페이지 매물만)
+    thumb_map = thumb_map_for([p.id for p in properties])
 
     # 10. 최종 결과물을 HTML 템플릿으로 전달
     return render_template(
@@ -905,145 +1929,218 @@ def delete_all():
 @app.route("/search", methods=["GET"])
 @login_required
 def search():
+    query = build_search_query(request.args)
 
-    query = Property.query
+    # 8. 페이지 처리 (cursor= 가 오면 커서 방식)
+    pagination = listing_page(query, search_sort_keys(request.args), per_page=30)
+    results = pagination.items
 
-    building = request.args.get("building", "")
-    categories = request.args.getlist("category")
-    sort = request.args.get("sort", "")
-    property_types = [pt for pt in request.args.getlist("property_type") if pt]  # 빈값 제거
-    locations = request.args.getlist("location") # ✅ 체크박스로 선택된 역 목록 가져오기
-    
-    opt_interior = request.args.get("opt_interior", "")
-    opt_gonghang = request.args.get("opt_gonghang", "")
-    opt_corner = request.args.get("opt_corner", "")
-
-    min_deposit = request.args.get("min_deposit", "")
-    max_deposit = request.args.get("max_deposit", "")
-    min_rent = request.args.get("min_rent", "")
-    max_rent = request.args.get("max_rent", "")
-    min_area = request.args.get("min_area", "")
-    max_area = request.args.get("max_area", "")
-    min_sale = request.args.get("min_sale", "")
-    max_sale = request.args.get("max_sale", "")
-
-    # 1. 건물명 직접 검색
-    if building:
-        query = query.filter(Property.building_name.like(f"%{building}%"))
+    last_upload = UploadLog.query.order_by(UploadLog.id.desc()).first()
+    upload_time = last_upload.upload_time if last_upload else "-"
 
-    # 2. ✅ 위치(역) 체크박스 필터링 적용 (문제 해결의 핵심!)
-    if locations:
-        location_conditions = []
-        for loc in locations:
-            if loc in LOCATION_MAPPING:
-                buildings = LOCATION_MAPPING[loc]
-                for b in buildings:
-                    location_conditions.append(Property.building_name.contains(b))
-        
-        # 선택된 역의 건물 중 하나라도 일치하면 검색 결과에 포함
-        if location_conditions:
-            query = query.filter(or_(*location_conditions))
+    collections = Collection.query.all()
 
-    # 3. 매물종류(상가/사무실) 필터링
-    if property_types:
-        query = query.filter(Property.property_type.in_(property_types))
+    existing_pairs = collection_pairs_for([p.id for p in results])
 
-    # 4. 거래구분(매매/월세) 필터링
-    if categories:
-        query = query.filter(Property.category.in_(categories))
+    # 9. 사진 썸네일 세팅 (현재 페이지 매물만)
+    thumb_map = thumb_map_for([p.id for p in results])
 
-    # 5. 금액 조건 필터링
-    if min_deposit:
-        query = query.filter(Property.deposit >= int(min_deposit))
-    if max_deposit:
-        query = query.filter(Property.deposit <= int(max_deposit))
-
-    if min_rent:
-        query = query.filter(Property.rent >= int(min_rent))
-    if max_rent:
-        query = query.filter(Property.rent <= int(max_rent))
-
-    if min_sale:
-        query = query.filter(Property.sale_price >= int(min_sale))
-    if max_sale:
-        query = query.filter(Property.sale_price <= int(max_sale))
-
-    if min_area:
-        query = query.filter(Property.exclusive_area >= float(min_area))
-    if max_area:
-        query = query.filter(Property.exclusive_area <= float(max_area))
+    return render_template(
+        "search.html",
+        properties=results,
+        collections=collections,
+        existing_pairs=existing_pairs,
+        format_sale_price_korean=format_sale_price_korean,
+        upload_time=upload_time,
+        thumb_map=thumb_map,
+        pagination=pagination
+    )
 
-    # 6. 옵션(인테리어, 코너 등) 필터링
-    if opt_interior == "on":
-        query = query.filter(Property.has_interior == True)
-    if opt_gonghang == "on":
-        query = query.filter(Property.has_gonghang == True)
-    if opt_corner == "on":
-        query = query.filter(Property.has_corner == True)    
 
-    # 7. 정렬 로직
-    if sort == "rent_asc":
-        query = query.order_by(
-            case((Property.category == "월세", 0), else_=1),
-            Property.rent.asc()
-        )
-    elif sort == "rent_desc":
-        query = query.order_by(
-            case((Property.category == "월세", 0), else_=1),
-            Property.rent.desc()
-        )
-    elif sort == "sale_asc":
-        query = query.order_by(
-            case((Property.category == "매매", 0), else_=1),
-            Property.sale_price.asc()
-        )
-    elif sort == "sale_desc":
-        query = query.order_by(
-            case((Property.category == "매매", 0), else_=1),
-            Property.sale_price.desc()
-        )
-    elif sort == "area_asc":
-        query = query.order_by(Property.exclusive_area.asc())
-    elif sort == "area_desc":
-        query = query.order_by(Property.exclusive_area.desc())
+# ✅ 모바일 카드 목록용 JSON API (search() 와 같은 필터/정렬, 필요한 필드만)
+API_PROPERTY_FIELDS = (
+    "id", "building_name", "property_type", "category", "status",
+    "deposit", "rent", "sale_price", "exclusive_area", "contract_area",
+    "station", "has_interior", "has_gonghang", "has_corner", "private_memo",
+)
+API_EXTRA_FIELDS = ("thumbs", "collection_ids")
+API_DEFAULT_FIELDS = (
+    "id", "building_name", "property_type", "category",
+    "deposit", "rent", "sale_price", "exclusive_area", "contract_area", "thumbs",
+)
 
-    # 8. 페이지 처리
-    page = request.args.get('page', 1, type=int)
-    pagination = query.paginate(page=page, per_page=30, error_out=False)
-    results = pagination.items
 
-    last_upload = UploadLog.query.order_by(UploadLog.id.desc()).first()
-    upload_time = last_upload.upload_time if last_upload else "-"
+@app.route("/api/properties")
+@login_required
+def api_properties():
+    """
+    /api/properties?category=월세&sort=rent_asc&fields=id,building_name,rent&cursor=
+    - 필터/정렬 파라미터는 /search 와 동일
+    - 기본은 커서(무한 스크롤) 방식, page= 를 주면 번호 페이지
+    - ETag 가 같으면 304 (본문 없이)
+    """
+    requested = [f.strip() for f in request.args.get("fields", "").split(",") if f.strip()]
+    fields = [f for f in requested if f in API_PROPERTY_FIELDS or f in API_EXTRA_FIELDS] or list(API_DEFAULT_FIELDS)
+    columns = [f for f in fields if f in API_PROPERTY_FIELDS]
+    per_page = min(max(request.args.get("per_page", 30, type=int), 1), 100)
 
-    collections = Collection.query.all()
+    query = build_search_query(request.args)
+    # 필요한 컬럼만 읽음 (id 는 커서/사진 매칭에 항상 필요)
+    query = query.options(load_only(*[getattr(Property, f) for f in set(columns) | {"id"}]))
 
-    existing_pairs = set(
-        (item.property_id, item.collection_id)
-        for item in CollectionItem.query.all()
-    )
+    default_cursor = None if "page" in request.args else ""
+    pagination = listing_page(query, search_sort_keys(request.args), per_page, default_cursor=default_cursor)
+    properties = pagination.items
+    property_ids = [p.id for p in properties]
+
+    thumb_map = thumb_map_for(property_ids) if "thumbs" in fields else {}
+    collection_ids = {}
+    if "collection_ids" in fields:
+        for property_id, collection_id in sorted(collection_pairs_for(property_ids)):
+            collection_ids.setdefault(property_id, []).append(collection_id)
+
+    items = []
+    for p in properties:
+        item = {f: getattr(p, f) for f in columns}
+        if "thumbs" in fields:
+            item["thumbs"] = thumb_map.get(p.id, [])
+        if "collection_ids" in fields:
+            item["collection_ids"] = collection_ids.get(p.id, [])
+        items.append(item)
+
+    payload = {"items": items, "total": pagination.total}
+    if getattr(pagination, "is_keyset", False):
+        payload["next_cursor"] = pagination.next_cursor
+        payload["next"] = pagination.next_url
+    else:
+        payload["page"] = pagination.page
+        payload["pages"] = pagination.pages
+
+    response = jsonify(payload)
+    response.headers["Cache-Control"] = "private, no-cache"
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+def iter_upload_lines(stream, encoding="utf-8", chunk_size=64 * 1024):
+    """
+    업로드 스트림을 조금씩 읽어서 한 줄씩 돌려주는 제너레이터
+    (파일 전체를 bytes/str/줄 리스트로 동시에 들고 있지 않아서 대용량 TXT도 메모리가 일정함)
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors="ignore")
+    pending = ""
+    while True:
+        chunk = stream.read(chunk_size)
+        pending += decoder.decode(chunk or b"", final=not chunk)
+        lines = pending.splitlines(True)
+        # 마지막 줄은 다음 조각과 이어질 수 있으므로 남겨둠 ('\r' + '\n' 분리 포함)
+        pending = lines.pop() if (lines and chunk) else ""
+        yield from lines
+        if not chunk:
+            break
+
+
+def _store_latest(latest_props, entry, cutoff):
+    # ✅ 60일 이전 대화는 어차피 등록하지 않으므로 메모를 들고 있지 않음 (대용량 TXT 메모리 절약)
+    if entry['ts'] < cutoff:
+        latest_props.pop(entry['building_name'], None)
+    else:
+        latest_props[entry['building_name']] = entry
+
+
+KAKAO_HEADER_PATTERN = re.compile(r'^\[.+?\] \[(오전|오후) (\d+):(\d+)\] (.+)')
+KAKAO_DATE_PATTERN = re.compile(r'^-+ (\d{4})년 (\d{1,2})월 (\d{1,2})일')
+
+
+def _kakao_date(date_match):
+    return datetime(int(date_match.group(1)), int(date_match.group(2)), int(date_match.group(3)))
+
+
+def _kakao_header_ts(match, current_date):
+    period = match.group(1)  # 오전/오후
+    hh = int(match.group(2))
+    mm = int(match.group(3))
+
+    # ✅ 12시간제 -> 24시간제 변환 (카톡 시간)
+    if period == "오전":
+        hour24 = 0 if hh == 12 else hh
+    else:  # 오후
+        hour24 = hh if hh == 12 else hh + 12
+
+    return current_date.replace(hour=hour24, minute=mm, second=0, microsecond=0)
+
+
+def _kakao_message_hash(ts, header_line):
+    # 같은 분(minute)에 올라온 메시지끼리도 구분되도록 시간 + 헤더 줄 전체로 해시
+    return hashlib.sha1(f"{ts.isoformat()}|{header_line}".encode("utf-8")).hexdigest()
+
+
+def _skip_ingested_lines(lines, mark_ts, mark_hash, current_date):
+    """
+    이미 반영된 메시지(high-water mark 이전)는 날짜/헤더만 훑고 건너뜀
+    - mark 시간보다 늦은 첫 메시지(또는 mark 메시지 바로 다음 메시지)부터 그대로 흘려보냄
+    - mark 와 같은 분의 메시지는 hash 를 찾을 때까지 잠시 보관 → 못 찾으면 다시 흘려보냄(안전하게 재반영)
+    """
+    date_line = None
+    held_date_line = None
+    held = []
+    found = False
+
+    lines = iter(lines)
+    for line in lines:
+        s = line.strip()
+
+        date_match = KAKAO_DATE_PATTERN.match(s)
+        header = None if date_match else KAKAO_HEADER_PATTERN.match(s)
+
+        if found and (date_match or header):
+            break
+
+        if date_match:
+            current_date = _kakao_date(date_match)
+            date_line = line
+            if held:
+                held.append(line)
+            continue
+
+        if header:
+            ts = _kakao_header_ts(header, current_date)
+            if ts > mark_ts:
+                break
+            if ts < mark_ts:
+                held = []
+            elif _kakao_message_hash(ts, s) == mark_hash:
+                held = []
+                found = True
+            else:
+                if not held:
+                    held_date_line = date_line
+                held.append(line)
+            continue
 
-    # 9. 사진 썸네일 세팅
-    thumb_map = {}
-    for img in PropertyImage.query.order_by(PropertyImage.id.desc()).all():
-        if img.property_id not in thumb_map:
-            thumb_map[img.property_id] = []
-        if len(thumb_map[img.property_id]) < 2:
-            thumb_map[img.property_id].append(img.file_path)
+        if held:
+            held.append(line)
+    else:
+        # 끝까지 새 메시지가 없음 (hash 를 못 찾은 같은 분 메시지만 다시 흘려보냄)
+        line = None
 
-    return render_template(
-        "search.html",
-        properties=results,
-        collections=collections,
-        existing_pairs=existing_pairs,
-        format_sale_price_korean=format_sale_price_korean,
-        upload_time=upload_time,
-        thumb_map=thumb_map,
-        pagination=pagination
-    )
+    # 보관해둔 메시지가 있으면 그 시점의 날짜 줄부터 다시 흘려보냄
+    start_date_line = held_date_line if held else date_line
+    if start_date_line is not None and (held or line is not None):
+        yield start_date_line
+    yield from held
+    if line is not None:
+        yield line
+        yield from lines
 
 
-def parse_kakao_text(text_data, target_property_type="사무실"):
-    lines = text_data.splitlines()
+def parse_kakao_text(text_data, target_property_type="사무실", chat_key=None, incremental=True):
+    """
+    chat_key 를 주면 대화방+매물종류별 high-water mark 이후의 새 메시지만 반영 (증분 등록)
+    incremental=False 면 처음부터 전부 다시 읽고 mark 만 새로 기록
+    """
+    # ✅ 문자열 전체 또는 줄 단위 이터레이터(iter_upload_lines) 둘 다 받음
+    lines = text_data.splitlines() if isinstance(text_data, str) else text_data
     
     latest_props = {}
     current_title = None
@@ -1055,9 +2152,13 @@ def parse_kakao_text(text_data, target_property_type="사무실"):
     now = datetime.now()
     current_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
     two_months_ago = now - timedelta(days=60)
-    
-    header_pattern = re.compile(r'^\[.+?\] \[(오전|오후) (\d+):(\d+)\] (.+)')
-    date_pattern = re.compile(r'^-+ (\d{4})년 (\d{1,2})월 (\d{1,2})일')
+
+    mark = None
+    last_message = None
+    if chat_key:
+        mark = KakaoImportMark.query.filter_by(chat_key=chat_key, property_type=target_property_type).first()
+        if incremental and mark and mark.last_ts:
+            lines = _skip_ingested_lines(lines, mark.last_ts, mark.last_hash, current_date)
 
     out_keywords = ['아웃', '매도함', '계약완료', '거래완료', '임대완료', '매매완료', '계약됨', '거래됨', '계약진행중']
 
@@ -1066,38 +2167,30 @@ def parse_kakao_text(text_data, target_property_type="사무실"):
         if not line or line == "메시지가 삭제되었습니다.":
             continue
 
-        date_match = date_pattern.match(line)
+        date_match = KAKAO_DATE_PATTERN.match(line)
         if date_match:
-            current_date = datetime(int(date_match.group(1)), int(date_match.group(2)), int(date_match.group(3)))
+            current_date = _kakao_date(date_match)
             continue
 
         if line.startswith("---------------"):
             continue
 
-        match = header_pattern.match(line)
+        match = KAKAO_HEADER_PATTERN.match(line)
         if match:
             # ✅ 이전 매물 저장 (이 매물의 마지막 카톡 시간 = current_ts)
             if current_title:
-                latest_props[current_title] = {
+                _store_latest(latest_props, {
                     'building_name': current_title,
                     'status': current_status,
                     'raw_memo': current_raw_memo,
                     'ts': current_ts or current_date
-                }
+                }, two_months_ago)
 
-            period = match.group(1)  # 오전/오후
-            hh = int(match.group(2))
-            mm = int(match.group(3))
             raw_title = match.group(4).strip()
 
-            # ✅ 12시간제 -> 24시간제 변환 (카톡 시간)
-            if period == "오전":
-                hour24 = 0 if hh == 12 else hh
-            else:  # 오후
-                hour24 = hh if hh == 12 else hh + 12
-
             # ✅ 현재 매물의 '카톡 업로드 시간' 저장
-            current_ts = current_date.replace(hour=hour24, minute=mm, second=0, microsecond=0)
+            current_ts = _kakao_header_ts(match, current_date)
+            last_message = (current_ts, _kakao_message_hash(current_ts, line))
 
             upper_title = raw_title.upper()
 
@@ -1128,15 +2221,34 @@ def parse_kakao_text(text_data, target_property_type="사무실"):
                 current_status = 'hold'
 
     if current_title:
-        latest_props[current_title] = {
+        _store_latest(latest_props, {
             'building_name': current_title,
             'status': current_status,
             'raw_memo': current_raw_memo,
             'ts': current_ts or current_date
-        }
+        }, two_months_ago)
 
     count = 0
-    
+
+    # ✅ 기존 매물 키(건물명, 구분)를 한 번에 로딩 → 매물마다 SELECT 하지 않음
+    existing_ids = {}
+    first_id_by_name = {}
+    for pid, b_name, cat in db.session.query(Property.id, Property.building_name, Property.category).order_by(Property.id):
+        existing_ids.setdefault((b_name, cat), pid)
+        first_id_by_name.setdefault(b_name, pid)
+
+    to_insert = []
+    to_update = []
+    to_delete = []
+
+    def queue_upsert(building_name, category, values):
+        values = dict(values, station=station_for_building(building_name))
+        pid = existing_ids.get((building_name, category))
+        if pid:
+            to_update.append(dict(values, id=pid))
+        else:
+            to_insert.append(dict(values, building_name=building_name, category=category, property_type=target_property_type))
+
     for p in latest_props.values():
         
         # ⚠️ [주의] 오늘 기준 60일(두 달) 이전의 과거 대화는 삭제됨!
@@ -1144,23 +2256,9 @@ def parse_kakao_text(text_data, target_property_type="사무실"):
             continue
 
         if p['status'] == 'out' or p['status'] == 'hold':
-            existing = Property.query.filter_by(building_name=p['building_name']).first()
-            if existing:
-                # 🔥 [자동 청소 로직] 아웃된 매물에 연결된 사진들을 폴더에서 찾아 완전히 삭제합니다.
-                orphan_images = PropertyImage.query.filter_by(property_id=existing.id).all()
-                for img in orphan_images:
-                    try:
-                        # 실제 컴퓨터(서버) 폴더에서 이미지 파일 삭제 (용량 확보)
-                        path = img.file_path.lstrip("/")
-                        if os.path.exists(path):
-                            os.remove(path)
-                    except:
-                        pass
-                    # DB에서 사진 기록 삭제
-                    db.session.delete(img)
-                
-                # 매물 데이터 삭제
-                db.session.delete(existing)
+            existing_id = first_id_by_name.get(p['building_name'])
+            if existing_id:
+                to_delete.append(existing_id)
             continue
 
         body_text = '\n'.join(p['raw_memo'])
@@ -1249,87 +2347,23 @@ def parse_kakao_text(text_data, target_property_type="사무실"):
         has_corner = bool(re.search(r'(코너|양창)', body_text))
         has_gonghang = bool(re.search(r'(공항)', body_text))
 
-        property_type = target_property_type
-
         # -----------------------------
         # 🔥 임대 + 매매 동시에 있는 경우 분리 등록
         # -----------------------------
+        common = {
+            'exclusive_area': exc_area,
+            'contract_area': con_area,
+            'private_memo': body_text,
+            'source_ts': p['ts'],
+            'has_interior': has_interior,
+            'has_gonghang': has_gonghang,
+            'has_corner': has_corner,
+        }
 
         # ✅ 둘 다 있는 경우
         if sale_price > 0 and rent > 0:
-
-            # ===== 월세 등록 =====
-            rent_existing = Property.query.filter_by(
-                building_name=p['building_name'],
-                category="월세"
-            ).first()
-
-            if rent_existing:
-                rent_existing.exclusive_area = exc_area
-                rent_existing.contract_area = con_area
-                rent_existing.deposit = deposit
-                rent_existing.rent = rent
-                rent_existing.sale_price = 0
-                rent_existing.private_memo = body_text
-                rent_existing.source_ts = p['ts']
-                # 👇 추가됨
-                rent_existing.has_interior = has_interior
-                rent_existing.has_gonghang = has_gonghang
-                rent_existing.has_corner = has_corner
-            else:
-                db.session.add(Property(
-                    building_name=p['building_name'],
-                    exclusive_area=exc_area,
-                    contract_area=con_area,
-                    deposit=deposit,
-                    rent=rent,
-                    sale_price=0,
-                    private_memo=body_text,
-                    category="월세",
-                    property_type=property_type,
-                    source_ts=p['ts'],
-                    # 👇 추가됨
-                    has_interior=has_interior,
-                    has_gonghang=has_gonghang,
-                    has_corner=has_corner
-                ))
-
-            # ===== 매매 등록 =====
-            sale_existing = Property.query.filter_by(
-                building_name=p['building_name'],
-                category="매매"
-            ).first()
-
-            if sale_existing:
-                sale_existing.exclusive_area = exc_area
-                sale_existing.contract_area = con_area
-                sale_existing.deposit = 0
-                sale_existing.rent = 0
-                sale_existing.sale_price = sale_price
-                sale_existing.private_memo = body_text
-                sale_existing.source_ts = p['ts']
-                # 👇 추가됨
-                sale_existing.has_interior = has_interior
-                sale_existing.has_gonghang = has_gonghang
-                sale_existing.has_corner = has_corner
-            else:
-                db.session.add(Property(
-                    building_name=p['building_name'],
-                    exclusive_area=exc_area,
-                    contract_area=con_area,
-                    deposit=0,
-                    rent=0,
-                    sale_price=sale_price,
-                    private_memo=body_text,
-                    category="매매",
-                    property_type=property_type,
-                    source_ts=p['ts'],
-                    # 👇 추가됨
-                    has_interior=has_interior,
-                    has_gonghang=has_gonghang,
-                    has_corner=has_corner
-                ))
-
+            queue_upsert(p['building_name'], "월세", dict(common, deposit=deposit, rent=rent, sale_price=0))
+            queue_upsert(p['building_name'], "매매", dict(common, deposit=0, rent=0, sale_price=sale_price))
             count += 2
             continue
 
@@ -1338,48 +2372,516 @@ def parse_kakao_text(text_data, target_property_type="사무실"):
         # -----------------------------
 
         category_val = '매매' if (sale_price > 0 and rent == 0) else '월세'
+        queue_upsert(p['building_name'], category_val, dict(common, deposit=deposit, rent=rent, sale_price=sale_price))
+
+        count += 1
+
+    # ✅ 모아둔 삭제/수정/추가를 한 트랜잭션에서 일괄 실행
+    for ids in _chunks(to_delete):
+        # 🔥 [자동 청소 로직] 아웃된 매물에 연결된 사진들을 폴더에서 찾아 완전히 삭제합니다.
+        # 실제 컴퓨터(서버) 폴더에서 이미지 파일 삭제 (용량 확보)
+        delete_uploaded_photos(
+            file_path for (file_path,) in
+            db.session.query(PropertyImage.file_path).filter(PropertyImage.property_id.in_(ids))
+        )
+        db.session.execute(delete(PropertyImage).where(PropertyImage.property_id.in_(ids)))
+        db.session.execute(delete(Property).where(Property.id.in_(ids)))
+
+    if to_update:
+        db.session.execute(update(Property), to_update)
+    if to_insert:
+        db.session.execute(insert(Property), to_insert)
+
+    # ✅ 다음 업로드는 이번에 읽은 마지막 메시지 이후부터
+    if chat_key and last_message:
+        if not mark:
+            mark = KakaoImportMark(chat_key=chat_key, property_type=target_property_type)
+            db.session.add(mark)
+        mark.last_ts, mark.last_hash = last_message
+        mark.updated_at = datetime.utcnow()
+
+    db.session.commit()
+    return count
+
+
+# ✅ 포스(POS) 엑셀 매물 가져오기
+#    - 시트는 pandas 로 한 번만 읽고, 면적/건물명은 행마다 파이썬 정규식을 돌리지 않고 열 단위(str.*)로 한꺼번에 파싱
+#    - 금액은 카톡 등록과 같은 parse_price_auto 로 (서로 다른 금액 문자열마다 한 번씩만)
+#    - pos_id 기준으로 기존 매물은 일괄 수정, 없는 매물은 일괄 추가
+#    - 읽은/반영/실패/건너뛴 행 수는 리포트로 돌려주고 작업 기록(ImportJob.report)에 저장 (/api/stats 에서 확인)
+POS_EXCEL_COLUMNS = {
+    "pos_id": ("매물번호", "관리번호", "번호"),
+    "property_type": ("매물종류", "종류"),
+    "building_name": ("건물명",),
+    "exclusive_area": ("전용면적", "전용"),
+    "contract_area": ("계약면적", "공급면적", "계약"),
+    "deal_type": ("거래구분", "거래종류", "거래"),
+    "price": ("금액", "가격", "매물가"),
+    "private_memo": ("비공개메모", "메모"),
+}
+POS_EXCEL_HEADER_SCAN_ROWS = 20  # 맨 위 제목줄('매물인쇄' 등) 아래에서 헤더 줄을 찾는 범위
+POS_EXCEL_TYPE_MAP = {"상가점포": "상가", "지식산업센터": "사무실", "아파트": "주거용", "오피스텔": "주거용"}  # = convert_property_type
+POS_EXCEL_FAILED_SAMPLES = 20
+
+
+def _pos_excel_header_key(value):
+    return re.sub(r"[\s()\[\]㎡평]", "", str(value or ""))
+
+
+def _pos_excel_column_map(header_values):
+    """헤더 줄 → {필드: 열 위치} (별칭 중 먼저 나온 열 사용)"""
+    keys = [_pos_excel_header_key(v) for v in header_values]
+    found = {}
+    for field, aliases in POS_EXCEL_COLUMNS.items():
+        for alias in aliases:
+            if alias in keys:
+                found[field] = keys.index(alias)
+                break
+    return found
+
+
+def read_pos_excel(file):
+    """
+    포스 엑셀 → 필드 이름으로 된 문자열 DataFrame
+    (모든 칸을 문자열로 읽어야 '3억5000', '500/50' 같은 가격이 숫자로 바뀌지 않음)
+    """
+    raw = pd.read_excel(file, header=None, dtype=str)
+
+    for header_row in range(min(POS_EXCEL_HEADER_SCAN_ROWS, len(raw))):
+        columns = _pos_excel_column_map(raw.iloc[header_row].tolist())
+        if "pos_id" in columns and "price" in columns:
+            break
+    else:
+        raise ValueError("포스 엑셀 헤더(매물번호 / 금액)를 찾지 못했습니다.")
+
+    body = raw.iloc[header_row + 1:]
+    df = pd.DataFrame({field: body.iloc[:, pos] for field, pos in columns.items()})
+    for field in POS_EXCEL_COLUMNS:
+        if field not in df:
+            df[field] = ""
+    return df.fillna("").astype(str).reset_index(drop=True)
+
+
+def _first_number(s):
+    """열 단위 safe_float_from_text (숫자가 없으면 0)"""
+    return pd.to_numeric(s.str.extract(r"(\d+(?:\.\d+)?)", expand=False), errors="coerce").fillna(0)
+
+
+def _pos_excel_amounts(price):
+    """
+    금액 칸 → (deposit, rent, sale) DataFrame (만원 단위)
+    카톡 등록과 같은 값이 저장되도록 parse_price_auto 를 그대로 씀 (같은 금액 문자열은 한 번만 계산)
+    """
+    amounts = {}
+    for text in price.unique():
+        try:
+            _, deposit, rent, sale = parse_price_auto(text)
+        except (IndexError, ValueError):
+            deposit = rent = sale = 0
+        amounts[text] = (deposit, rent, sale)
+    return pd.DataFrame(price.map(amounts).tolist(), index=price.index, columns=["deposit", "rent", "sale"], dtype="int64")
+
+
+def _pos_excel_building_names(df):
+    """열 단위 building_name_from_private_memo (건물명 칸이 비어 있을 때만 사용)"""
+    memo = df["private_memo"].str.strip()
+    first = memo.str.split(r"\r\n|\r|\n", n=1, regex=True).str[0].str.strip()
+    from_memo = (
+        first.str.extract(r"^(.+?\d+(?:-\d+)?호)", expand=False)
+        .fillna(memo.str.extract(r"(.+?\d+(?:-\d+)?호)", expand=False))
+        .fillna(first)
+        .str.replace(r"\s+", " ", regex=True).str.strip()
+    )
+    given = df["building_name"].str.replace(r"\s+", " ", regex=True).str.strip()
+    return given.where(given != "", from_memo)
+
+
+def parse_pos_excel(df):
+    """
+    read_pos_excel 결과 → (Property 값 DataFrame, 실패 행 DataFrame, 건너뛴 행 수)
+    - 매물번호가 없는 줄(빈 줄/합계 줄)과 같은 파일 안의 중복 매물번호(마지막 줄만 사용)는 건너뜀
+    - 거래구분/금액을 못 읽은 줄은 실패
+    """
+    df = df.assign(pos_id=df["pos_id"].str.strip().str.replace(r"\.0$", "", regex=True))
+    has_id = df["pos_id"] != ""
+    keep = has_id & ~df["pos_id"].duplicated(keep="last")
+    skipped = int((~keep).sum())
+    df = df[keep]
+
+    price = df["price"].str.replace(r"[,\s]", "", regex=True)
+    deal = df["deal_type"]
+    is_rent_text = price.str.contains("/", regex=False)
+    has_digits = price.str.contains(r"\d", regex=True)
+
+    # 거래구분 칸이 우선, 없으면 금액 모양으로 판정 (parse_price_auto 와 같음: '/' 있으면 월세)
+    category = pd.Series("", index=df.index)
+    category = category.mask(has_digits, "매매").mask(is_rent_text, "월세")
+    category = category.mask(deal.str.contains("매매", regex=False), "매매").mask(deal.str.contains("월세", regex=False), "월세")
+
+    is_rent = category == "월세"
+    is_sale = category == "매매"
+
+    # '보증금/월세' 가 아니면 parse_price_auto 는 금액 하나로 읽음 → 월세 매물이면 보증금으로
+    amounts = _pos_excel_amounts(price)
+    deposit = amounts["deposit"].where(is_rent_text, amounts["sale"]).where(is_rent, 0)
+    rent = amounts["rent"].where(is_rent, 0)
+    sale_price = amounts["sale"].where(is_sale, 0)
+
+    failed = (category == "") | ((deposit == 0) & (rent == 0) & (sale_price == 0))
+
+    memo_flat = df["private_memo"].str.replace(r"\s+", "", regex=True)
+    building_name = _pos_excel_building_names(df)
+
+    values = pd.DataFrame({
+        "pos_id": df["pos_id"],
+        "building_name": building_name,
+        "property_type": df["property_type"].str.strip().replace(POS_EXCEL_TYPE_MAP),
+        "category": category,
+        "deposit": deposit,
+        "rent": rent,
+        "sale_price": sale_price,
+        # 포스 면적은 ㎡ → 평 (to_pyung)
+        "exclusive_area": (_first_number(df["exclusive_area"]) / 3.3).round(2),
+        "contract_area": (_first_number(df["contract_area"]) / 3.3).round(2),
+        "private_memo": df["private_memo"].str.strip(),
+        # _guess_options_from_memo 와 같은 규칙
+        "has_interior": memo_flat.str.contains(r"(?:룸|인테리어|탕비실|에어컨|냉난방|스튜디오|강의실|뷰티|미용)", regex=True),
+        "has_gonghang": memo_flat.str.contains(r"(?:공항대로|공항)", regex=True),
+        "has_corner": memo_flat.str.contains(r"(?:코너|양창|북동|북서|남동|남서)", regex=True),
+        "status": "available",
+    })
+    # 가까운 역은 건물명 종류 수만큼만 계산
+    stations = {name: station_for_building(name) for name in building_name[~failed].unique()}
+    values["station"] = values["building_name"].map(stations)
+
+    failed_rows = df.loc[failed, ["pos_id", "deal_type", "price"]]
+    return values[~failed], failed_rows, skipped
 
-        existing_prop = Property.query.filter_by(
-            building_name=p['building_name'],
-            category=category_val
-        ).first()
-
-        if existing_prop:
-            existing_prop.exclusive_area = exc_area
-            existing_prop.contract_area = con_area
-            existing_prop.deposit = deposit
-            existing_prop.rent = rent
-            existing_prop.sale_price = sale_price
-            existing_prop.private_memo = body_text
-            existing_prop.source_ts = p['ts']
-            # 👇 추가됨
-            existing_prop.has_interior = has_interior
-            existing_prop.has_gonghang = has_gonghang
-            existing_prop.has_corner = has_corner
+
+def upsert_pos_rows(values):
+    """pos_id 기준 일괄 upsert → (추가 수, 수정 수)"""
+    records = values.to_dict("records")
+
+    existing_ids = {}
+    for ids in _chunks([r["pos_id"] for r in records]):
+        existing_ids.update(db.session.query(Property.pos_id, Property.id).filter(Property.pos_id.in_(ids)))
+
+    to_update, to_insert = [], []
+    for r in records:
+        pid = existing_ids.get(r["pos_id"])
+        if pid:
+            to_update.append(dict(r, id=pid))
         else:
-            db.session.add(Property(
-                building_name=p['building_name'],
-                exclusive_area=exc_area,
-                contract_area=con_area,
-                deposit=deposit,
-                rent=rent,
-                sale_price=sale_price,
-                private_memo=body_text,
-                category=category_val,
-                property_type=property_type,
-                source_ts=p['ts'],
-                # 👇 추가됨
-                has_interior=has_interior,
-                has_gonghang=has_gonghang,
-                has_corner=has_corner
-            ))
+            to_insert.append(r)
+
+    if to_update:
+        db.session.execute(update(Property), to_update)
+    if to_insert:
+        db.session.execute(insert(Property), to_insert)
+    db.session.add(UploadLog(upload_time=datetime.now().strftime("%Y-%m-%d %H:%M")))
+    db.session.commit()
+    return len(to_insert), len(to_update)
 
-        count += 1
 
+def import_pos_excel(file, filename=None, progress=None):
+    """
+    포스 엑셀 파일 → Property upsert → (반영한 매물 수, 리포트 dict)
+    progress(비율, 메시지) 를 주면 단계마다 호출
+    """
+    started = time.perf_counter()
+    progress = progress or (lambda ratio, message: None)
+
+    progress(0.1, "엑셀 읽는 중")
+    df = read_pos_excel(file)
+    progress(0.4, "매물 정리 중")
+    values, failed_rows, skipped = parse_pos_excel(df)
+    progress(0.7, "DB 반영 중")
+    inserted, updated = upsert_pos_rows(values)
+
+    report = {
+        "source": "pos_excel",
+        "file": filename or os.path.basename(str(file)),
+        "finished_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "seconds": round(time.perf_counter() - started, 2),
+        "rows_read": len(df),
+        "parsed": len(values),
+        "failed": len(failed_rows),
+        "skipped": skipped,
+        "inserted": inserted,
+        "updated": updated,
+        "failed_samples": failed_rows.head(POS_EXCEL_FAILED_SAMPLES).to_dict("records"),
+    }
+    return inserted + updated, report
+
+
+def import_pos_pdf(pdf_path, filename=None, progress=None):
+    """
+    포스 '매물인쇄' PDF → OCR → Property 추가/수정 → (반영한 매물 수, 리포트 dict)
+    PDF 에는 매물번호가 없어서 같은 거래구분 + 같은 비공개메모인 매물을 같은 매물로 보고 수정
+    """
+    progress = progress or (lambda ratio, message: None)
+    stats = {}
+    started = time.perf_counter()
+    row_count = 0
+
+    # 페이지마다 진행률 기록 → OCR 이 오래 걸려도 작업 updated_at 이 계속 갱신됨 (멈춘 작업으로 오인 방지)
+    def page_done(done, total):
+        progress(round(0.05 + 0.75 * done / max(total, 1), 3), f"PDF 글자 읽는 중 (OCR {done}/{total}쪽)")
+
+    progress(0.05, "PDF 글자 읽는 중 (OCR)")
+    values, failed = [], []
+    # OCR 이 끝난 페이지의 행부터 바로 매물 값으로 정리
+    for r in iter_rows_from_pos_pdf(pdf_path, stats=stats, on_page=page_done):
+        row_count += 1
+        deposit, rent, sale_price = _parse_price_from_pdf(r["deal_type"], r["price_text"])
+        if not r["deal_type"] or not (deposit or rent or sale_price):
+            failed.append({"deal_type": r["deal_type"], "price": r["price_text"], "private_memo": r["private_memo"][:50]})
+            continue
+        building_name = building_name_from_private_memo(r["private_memo"])
+        has_interior, has_gonghang, has_corner = _guess_options_from_memo(r["private_memo"])
+        values.append({
+            "building_name": building_name,
+            "property_type": r["property_type"],
+            "category": r["deal_type"],
+            "deposit": deposit,
+            "rent": rent,
+            "sale_price": sale_price,
+            "exclusive_area": to_pyung(r["area_m2"]),
+            "private_memo": r["private_memo"],
+            "has_interior": has_interior,
+            "has_gonghang": has_gonghang,
+            "has_corner": has_corner,
+            "status": "available",
+            "station": station_for_building(building_name),
+        })
+
+    report = _pos_pdf_report(pdf_path, started, row_count, stats)
+    progress(0.8, "DB 반영 중")
+
+    existing_ids = {}
+    for memos in _chunks(list({v["private_memo"] for v in values})):
+        existing_ids.update(
+            ((category, memo), pid) for pid, category, memo in
+            db.session.query(Property.id, Property.category, Property.private_memo).filter(Property.private_memo.in_(memos))
+        )
+    to_update = [dict(v, id=existing_ids[(v["category"], v["private_memo"])]) for v in values if (v["category"], v["private_memo"]) in existing_ids]
+    to_insert = [v for v in values if (v["category"], v["private_memo"]) not in existing_ids]
+
+    if to_update:
+        db.session.execute(update(Property), to_update)
+    if to_insert:
+        db.session.execute(insert(Property), to_insert)
+    db.session.add(UploadLog(upload_time=datetime.now().strftime("%Y-%m-%d %H:%M")))
     db.session.commit()
+
+    report.update(
+        file=filename or report["file"],
+        failed=len(failed),
+        inserted=len(to_insert),
+        updated=len(to_update),
+        failed_samples=failed[:POS_EXCEL_FAILED_SAMPLES],
+    )
+    return len(to_insert) + len(to_update), report
+
+
+# ✅ 백그라운드 등록 작업 실행기
+#    - 워커 프로세스마다 스레드 1개가 import_job 테이블에서 대기 작업을 가져가 실행
+#    - 사이트 전체에서 동시에 하나만 실행 (SQLite 쓰기 잠금 / 같은 대화방 mark 경쟁 방지)
+#    - 워커가 죽어서 멈춘 running 작업은 IMPORT_JOB_STALE_SECONDS 뒤 실패 처리
+app.config.setdefault("IMPORT_JOB_FOLDER", os.path.join(app.instance_path, "import_jobs"))
+IMPORT_JOB_POLL_SECONDS = 2
+IMPORT_JOB_STALE_SECONDS = 600
+IMPORT_JOB_HANDLERS = {}
+IMPORT_WORKER = {"pid": None, "thread": None, "wake": None}
+_IMPORT_WORKER_LOCK = threading.Lock()
+
+
+def import_job_handler(kind):
+    """IMPORT_JOB_HANDLERS 에 작업 종류 등록 (handler(job_id, file_path, params) → 반영 건수)"""
+    def register(fn):
+        IMPORT_JOB_HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+def _update_job(job_id, **values):
+    """
+    실행 중(running)인 작업만 갱신 → 갱신했으면 True
+    - 작업 세션(매물 반영 중)과 별개 연결로 바로 커밋 → 다른 워커의 진행률 조회에 즉시 보임
+    - 멈춘 작업으로 실패 처리된 뒤 늦게 끝난 실행기가 done/리포트로 덮어쓰지 않음
+    """
+    values["updated_at"] = datetime.utcnow()
+    job = ImportJob.__table__
+    try:
+        with db.engine.begin() as conn:
+            updated = conn.execute(
+                update(job).where(job.c.id == job_id, job.c.status == "running").values(**values)
+            ).rowcount
+    except Exception as e:
+        print(f"등록 작업 상태 저장 실패 ({job_id}): {e}")
+        return False
+    return bool(updated)
+
+
+class _ProgressStream:
+    """읽은 바이트 수로 진행률 기록 (DB 갱신은 1초에 한 번만, 다 읽으면 'DB 반영 중')"""
+
+    def __init__(self, f, job_id, total_bytes, span=0.9):
+        self._f = f
+        self.job_id = job_id
+        self.total_bytes = max(total_bytes, 1)
+        self.span = span
+        self.read_bytes = 0
+        self._last = time.monotonic()
+
+    def read(self, size=-1):
+        chunk = self._f.read(size)
+        self.read_bytes += len(chunk)
+        now = time.monotonic()
+        if not chunk:
+            _update_job(self.job_id, progress=self.span, message="DB 반영 중")
+        elif now - self._last >= 1:
+            self._last = now
+            _update_job(self.job_id, progress=round(self.span * self.read_bytes / self.total_bytes, 3))
+        return chunk
+
+
+@import_job_handler("kakao_txt")
+def run_kakao_import_job(job_id, file_path, params):
+    with open(file_path, "rb") as f:
+        text_data = iter_upload_lines(_ProgressStream(f, job_id, os.path.getsize(file_path)))
+
+        # ✅ 대화방 구분: 카톡 내보내기 첫 줄('OOO 님과 카카오톡 대화')
+        first_line = next(text_data, "").strip()
+        chat_key = (first_line or params.get("filename", ""))[:200]
+        text_data = itertools.chain([first_line], text_data)
+
+        return parse_kakao_text(
+            text_data, params.get("property_type", "사무실"),
+            chat_key=chat_key, incremental=params.get("incremental", True)
+        )
+
+
+@import_job_handler("pos_excel")
+def run_pos_excel_import_job(job_id, file_path, params):
+    def progress(ratio, message):
+        _update_job(job_id, progress=ratio, message=message)
+
+    count, report = import_pos_excel(file_path, filename=params.get("filename"), progress=progress)
+    _update_job(job_id, report=json.dumps(report, ensure_ascii=False))
+    return count
+
+
+@import_job_handler("pos_pdf")
+def run_pos_pdf_import_job(job_id, file_path, params):
+    def progress(ratio, message):
+        _update_job(job_id, progress=ratio, message=message)
+
+    # 페이지 수 / OCR 캐시 적중 수도 리포트와 함께 작업 기록에 저장
+    count, report = import_pos_pdf(file_path, filename=params.get("filename"), progress=progress)
+    _update_job(job_id, report=json.dumps(report, ensure_ascii=False))
     return count
 
 
+def enqueue_import_job(kind, upload, params):
+    """업로드 파일을 디스크에 저장하고 작업만 등록 (요청은 바로 끝남)"""
+    folder = app.config["IMPORT_JOB_FOLDER"]
+    os.makedirs(folder, exist_ok=True)
+    file_path = os.path.join(folder, f"{uuid.uuid4().hex}.upload")
+    upload.save(file_path)
+
+    job = ImportJob(kind=kind, file_path=file_path, params=json.dumps(params, ensure_ascii=False),
+                    status="queued", message="대기 중")
+    db.session.add(job)
+    db.session.commit()
+
+    ensure_import_worker()
+    IMPORT_WORKER["wake"].set()
+    return job
+
+
+def _claim_next_import_job():
+    now = datetime.utcnow()
+    ImportJob.query.filter(
+        ImportJob.status == "running",
+        ImportJob.updated_at < now - timedelta(seconds=IMPORT_JOB_STALE_SECONDS)
+    ).update({"status": "failed", "error": "작업이 중단되었습니다 (서버 재시작 등)", "finished_at": now})
+    db.session.commit()
+
+    # 실행 중인 작업이 없을 때만 가장 오래된 대기 작업 하나를 원자적으로 가져감
+    row = db.session.execute(db.text("""
+        UPDATE import_job SET status = 'running', started_at = :now, updated_at = :now, message = '읽는 중'
+        WHERE id = (SELECT MIN(id) FROM import_job WHERE status = 'queued')
+          AND NOT EXISTS (SELECT 1 FROM import_job WHERE status = 'running')
+        RETURNING id, kind, file_path, params
+    """), {"now": now}).first()
+    db.session.commit()
+    return row
+
+
+def run_next_import_job():
+    row = _claim_next_import_job()
+    if row is None:
+        return False
+
+    job_id, kind, file_path, params = row
+    try:
+        handler = IMPORT_JOB_HANDLERS[kind]
+        result = handler(job_id, file_path, json.loads(params or "{}"))
+        if not _update_job(job_id, status="done", progress=1.0, message="완료", result=result, finished_at=datetime.utcnow()):
+            print(f"등록 작업 {job_id}: 이미 실패 처리된 작업이라 완료로 바꾸지 않음")
+    except Exception as e:
+        db.session.rollback()
+        print(f"등록 작업 실패 ({job_id}): {e}")
+        _update_job(job_id, status="failed", message="실패", error=str(e)[:1000], finished_at=datetime.utcnow())
+    finally:
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
+    return True
+
+
+def _import_worker_loop(wake):
+    while True:
+        try:
+            with app.app_context():
+                ran = run_next_import_job()
+        except Exception as e:
+            print(f"등록 작업 실행기 오류: {e}")
+            ran = False
+        if not ran:
+            wake.wait(IMPORT_JOB_POLL_SECONDS)
+            wake.clear()
+
+
+def ensure_import_worker():
+    """현재 프로세스에 실행기 스레드가 없으면 시작 (gunicorn fork 후에도 프로세스별로 하나)"""
+    thread = IMPORT_WORKER["thread"]
+    if IMPORT_WORKER["pid"] == os.getpid() and thread is not None and thread.is_alive():
+        return
+    with _IMPORT_WORKER_LOCK:
+        thread = IMPORT_WORKER["thread"]
+        if IMPORT_WORKER["pid"] == os.getpid() and thread is not None and thread.is_alive():
+            return
+        wake = threading.Event()
+        thread = threading.Thread(target=_import_worker_loop, args=(wake,), name="import-worker", daemon=True)
+        IMPORT_WORKER.update(pid=os.getpid(), thread=thread, wake=wake)
+        thread.start()
+
+
+@app.before_request
+def _start_import_worker():
+    ensure_import_worker()
+
+
+@app.route("/api/import_jobs/<int:job_id>")
+@login_required
+def api_import_job(job_id):
+    job = ImportJob.query.get_or_404(job_id)
+    return jsonify(job.to_dict())
+
+
 @app.route("/register", methods=["GET", "POST"])
 @login_required
 def register():
@@ -1390,14 +2892,35 @@ def register():
         if form_type in ["kakao_txt_office", "kakao_txt_commercial"]:
             file = request.files.get("file")
             if file and file.filename.endswith('.txt'):
-                text_data = file.read().decode('utf-8', errors='ignore')
-                
-                if form_type == "kakao_txt_office":
-                    inserted_count = parse_kakao_text(text_data, "사무실")
-                elif form_type == "kakao_txt_commercial":
-                    inserted_count = parse_kakao_text(text_data, "상가")
-                    
-                return redirect(url_for("register", updated="true"))
+                # ✅ 파싱/DB 반영은 백그라운드 작업으로 → 요청은 작업 번호만 들고 바로 응답
+                job = enqueue_import_job("kakao_txt", file, {
+                    "property_type": "사무실" if form_type == "kakao_txt_office" else "상가",
+                    "incremental": not request.form.get("full_reimport"),
+                    "filename": file.filename,
+                })
+
+                if request.accept_mimetypes.accept_json and not request.accept_mimetypes.accept_html:
+                    return jsonify({"job_id": job.id, "status_url": url_for("api_import_job", job_id=job.id)}), 202
+                return redirect(url_for("register", job=job.id))
+
+        # ✅ 포스 엑셀: 매물번호(pos_id) 기준으로 추가/수정
+        if form_type == "pos_excel":
+            file = request.files.get("file")
+            if file and file.filename.lower().endswith(('.xlsx', '.xls')):
+                job = enqueue_import_job("pos_excel", file, {"filename": file.filename})
+
+                if request.accept_mimetypes.accept_json and not request.accept_mimetypes.accept_html:
+                    return jsonify({"job_id": job.id, "status_url": url_for("api_import_job", job_id=job.id)}), 202
+                return redirect(url_for("register", job=job.id))
+
+        if form_type == "pos_pdf":
+            file = request.files.get("file")
+            if file and file.filename.lower().endswith('.pdf'):
+                job = enqueue_import_job("pos_pdf", file, {"filename": file.filename})
+
+                if request.accept_mimetypes.accept_json and not request.accept_mimetypes.accept_html:
+                    return jsonify({"job_id": job.id, "status_url": url_for("api_import_job", job_id=job.id)}), 202
+                return redirect(url_for("register", job=job.id))
 
     rent_count = Property.query.filter_by(category="월세").count()
     sale_count = Property.query.filter_by(category="매매").count()
@@ -1448,42 +2971,29 @@ def collection_detail(id):
 
     sort = request.args.get("sort", "")
 
-    items = CollectionItem.query.filter_by(collection_id=id).all()
+    # -------- 정렬 로직 (DB에서 바로 정렬, 기본은 저장된 순서) --------
+    sort_columns = {
+        "name": [Property.building_name.asc()],
+        "area_desc": [Property.exclusive_area.desc()],
+        "area_asc": [Property.exclusive_area.asc()],
+        "rent_desc": [Property.rent.desc()],
+        "rent_asc": [Property.rent.asc()],
+    }.get(sort, [])
+
+    # ✅ 매물 + 리스트 항목을 한 번에 조인 조회 (매물마다 get 하지 않음)
+    rows = db.session.query(Property, CollectionItem.id).join(
+        CollectionItem, CollectionItem.property_id == Property.id
+    ).filter(
+        CollectionItem.collection_id == id
+    ).order_by(*sort_columns, CollectionItem.position.asc(), CollectionItem.id.asc())
 
     properties = []
+    for p, item_id in rows:
+        p.collection_item_id = item_id
+        properties.append(p)
 
-    for item in items:
-        p = Property.query.get(item.property_id)
-        if p:
-            p.collection_item_id = item.id
-            properties.append(p)
-
-    # -------- 정렬 로직 --------
-    if sort == "name":
-        properties = sorted(properties, key=lambda x: x.building_name)
-
-    elif sort == "area_desc":
-        properties = sorted(properties, key=lambda x: x.exclusive_area, reverse=True)
-
-    elif sort == "area_asc":
-        properties = sorted(properties, key=lambda x: x.exclusive_area)
-
-    elif sort == "rent_desc":
-        properties = sorted(properties, key=lambda x: x.rent, reverse=True)
-
-    elif sort == "rent_asc":
-        properties = sorted(properties, key=lambda x: x.rent)
-    # ---------------------------
-
-
-        # ✅ 카드 미리보기용 최신 사진 2장 (index/search와 동일)
-    # ✅ 카드 미리보기용 최신 사진 2장
-    thumb_map = {}
-    for img in PropertyImage.query.order_by(PropertyImage.id.desc()).all():
-        if img.property_id not in thumb_map:
-            thumb_map[img.property_id] = []
-        if len(thumb_map[img.property_id]) < 2:
-            thumb_map[img.property_id].append(img.file_path)
+    # ✅ 카드 미리보기용 최신 사진 2장 (index/search와 동일)
+    thumb_map = thumb_map_for([p.id for p in properties])
 
     return render_template(
         "collection_detail.html",
@@ -1802,14 +3312,8 @@ def delete_images(property_id):
 
     imgs = PropertyImage.query.filter_by(property_id=property_id).all()
 
+    delete_uploaded_photos(img.file_path for img in imgs)
     for img in imgs:
-        try:
-            path = img.file_path.lstrip("/")
-            if os.path.exists(path):
-                os.remove(path)
-        except:
-            pass
-
         db.session.delete(img)
 
     db.session.commit()
@@ -1837,19 +3341,44 @@ def delete_images_selected(property_id):
         PropertyImage.id.in_(image_ids)
     ).all()
 
+    delete_uploaded_photos(img.file_path for img in imgs)
     for img in imgs:
-        try:
-            path = img.file_path.lstrip("/")
-            if os.path.exists(path):
-                os.remove(path)
-        except:
-            pass
-
         db.session.delete(img)
 
     db.session.commit()
     return jsonify({"result":"ok"})
 
+def last_import_report():
+    """가장 최근에 끝난 가져오기 작업의 리포트 (DB 에 있으므로 어느 워커에서 조회해도 같음)"""
+    job = (ImportJob.query.filter(ImportJob.status == "done", ImportJob.report.isnot(None))
+           .order_by(ImportJob.finished_at.desc(), ImportJob.id.desc()).first())
+    if job is None:
+        return None
+    return dict(json.loads(job.report), job_id=job.id)
+
+
+# ✅ 운영 상태 확인용 통계 (캐시 적중률 등)
+@app.route("/api/stats")
+@login_required
+def api_stats():
+    normalize_cache = {}
+    for name, fn in [
+        ("clean_building_name", _clean_building_name_cached),
+        ("building_name_from_private_memo", building_name_from_private_memo),
+        ("trim_after_last_ho", trim_after_last_ho),
+    ]:
+        info = fn.cache_info()
+        normalize_cache[name] = {"hits": info.hits, "misses": info.misses, "size": info.currsize, "maxsize": info.maxsize}
+
+    return jsonify({
+        "alias_version": ALIAS_STATE["version"],
+        "normalize_cache": normalize_cache,
+        "query_cache": QUERY_CACHE.stats(),
+        "last_import_report": last_import_report(),
+        "data_generation": current_data_generation(),
+    })
+
+
 @app.route("/preview")
 def preview():
     return render_template("preview.html")
@@ -1880,7 +3409,10 @@ def property_detail(id):
         collections=collections,
         existing_pairs=existing_pairs,
         from_collection_id=from_collection_id,
-        format_sale_price_korean=format_sale_price_korean
+        format_sale_price_korean=format_sale_price_korean,
+        photo_variant_url=photo_variant_url,
+        photo_card_size=PHOTO_CARD_SIZE,
+        photo_large_size=PHOTO_LARGE_SIZE
     )
 
 
@@ -1903,70 +3435,725 @@ def delete_all_memos():
 # 📐 도면 창고 관련 라우트 (지역 폴더 구조 반영)
 # ==========================================
 
+# ✅ 공유폴더(SMB) 파일 로컬 캐시 (도면 / 찍은사진)
+#    - 원본 stat 한 번으로 수정시간/크기를 확인하고, 같으면 로컬 복사본을 그대로 전송
+#    - 원본이 바뀌면 파일 이름(경로 해시-수정시간-크기)이 달라져서 새로 복사, 예전 복사본은 용량 정리 때 삭제
+#    - ETag / Last-Modified 로 휴대폰은 304 로 싸게 재확인
+app.config.setdefault("SHARE_CACHE_FOLDER", os.path.join(app.instance_path, "share_cache"))
+app.config.setdefault("SHARE_CACHE_MAX_BYTES", 2 * 1024 * 1024 * 1024)
+SHARE_CACHE_PRUNE_EVERY = 50  # 새로 복사한 파일 수 기준
+SHARE_CACHE_STATE = {"copies": 0}
+FLOORPLAN_MAX_AGE = 24 * 3600  # 도면은 같은 이름으로 바뀔 수 있어서 하루
+PHOTO_MAX_AGE = 30 * 24 * 3600  # 찍은사진은 저장할 때 시간이 붙은 새 이름이라 한 달
+
+
+def _share_cache_path(source_path, st):
+    key = hashlib.sha1(os.path.normcase(source_path).encode("utf-8")).hexdigest()
+    ext = os.path.splitext(source_path)[1].lower()
+    return os.path.join(app.config["SHARE_CACHE_FOLDER"], f"{key}-{st.st_mtime_ns}-{st.st_size}{ext}")
+
+
+def cached_share_file(source_path):
+    """공유폴더 파일 → (전송할 경로, 원본 stat). 원본이 없으면 FileNotFoundError"""
+    st = os.stat(source_path)
+    if not stat.S_ISREG(st.st_mode):
+        raise FileNotFoundError(source_path)
+
+    local_path = _share_cache_path(source_path, st)
+    try:
+        os.utime(local_path)  # 최근 사용 표시 (용량 정리 때 오래 안 쓴 것부터 삭제)
+        return local_path, st
+    except FileNotFoundError:
+        pass
+
+    try:
+        os.makedirs(app.config["SHARE_CACHE_FOLDER"], exist_ok=True)
+        tmp_path = f"{local_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        shutil.copyfile(source_path, tmp_path)
+        # 복사하는 동안 원본이 바뀌었으면 이번엔 캐시에 넣지 않음
+        after = os.stat(source_path)
+        if (after.st_mtime_ns, after.st_size) != (st.st_mtime_ns, st.st_size):
+            os.remove(tmp_path)
+            return source_path, after
+        os.replace(tmp_path, local_path)
+    except OSError as e:
+        print(f"공유폴더 파일 캐시 저장 실패 (원본 직접 전송): {e}")
+        return source_path, st
+
+    SHARE_CACHE_STATE["copies"] += 1
+    if SHARE_CACHE_STATE["copies"] % SHARE_CACHE_PRUNE_EVERY == 0:
+        prune_share_cache()
+    return local_path, st
+
+
+def prune_share_cache(max_bytes=None):
+    max_bytes = app.config["SHARE_CACHE_MAX_BYTES"] if max_bytes is None else max_bytes
+    return _prune_cache_folder(app.config["SHARE_CACHE_FOLDER"], max_bytes)
+
+
+def send_share_file(directory, filename, max_age):
+    """send_from_directory 대신: 로컬 캐시를 거쳐 전송 + 검증용 헤더"""
+    source_path = safe_join(directory, filename)
+    if source_path is None:
+        return "파일을 찾을 수 없습니다.", 404
+    try:
+        path, st = cached_share_file(source_path)
+    except OSError:
+        return "파일을 찾을 수 없습니다.", 404
+
+    response = send_file(
+        path, conditional=True, max_age=max_age,
+        etag=f"{st.st_mtime_ns:x}-{st.st_size:x}", last_modified=st.st_mtime,
+    )
+    response.cache_control.public = False
+    response.cache_control.private = True
+    return response
+
+
+@app.route("/static/uploads/<path:filename>")
+def serve_uploaded_photo(filename):
+    # ✅ 찍은사진도 공유폴더 → 로컬 캐시 경유 (기본 static 처리보다 이 경로가 우선)
+    return send_share_file(app.config["UPLOAD_FOLDER"], filename, PHOTO_MAX_AGE)
+
+
+# ✅ 찍은사진 크기별 사본 (카드 320px / 상세·확대 1280px)
+#    - 처음 요청될 때 Pillow 로 만들고, 원본 내용 해시로 저장 → 같은 사진을 여러 매물에 올려도 한 번만 만듦
+#    - 원본(경로-수정시간-크기) → 내용 해시는 .ref 파일로 기억해서 다음부턴 원본을 다시 읽지 않음
+#    - 브라우저가 WebP 를 받으면 WebP, 아니면 JPEG
+app.config.setdefault("PHOTO_VARIANT_FOLDER", os.path.join(app.instance_path, "photo_variants"))
+app.config.setdefault("PHOTO_VARIANT_MAX_BYTES", 1024 * 1024 * 1024)
+PHOTO_CARD_SIZE = 320
+PHOTO_LARGE_SIZE = 1280
+PHOTO_VARIANT_SIZES = (PHOTO_CARD_SIZE, PHOTO_LARGE_SIZE)
+PHOTO_VARIANT_QUALITY = 80
+PHOTO_VARIANT_PRUNE_EVERY = 200  # 새로 만든 사본 수 기준
+PHOTO_VARIANT_STATE = {"created": 0}
+PHOTO_UPLOAD_PREFIX = "/static/uploads/"
+
+
+def photo_variant_url(file_path, size):
+    """DB 사진 경로 → 크기별 사본 주소 (공유폴더 사진이 아니면 원래 경로 그대로)"""
+    if not file_path or not file_path.startswith(PHOTO_UPLOAD_PREFIX):
+        return file_path
+    return url_for("serve_photo_variant", size=size, filename=file_path[len(PHOTO_UPLOAD_PREFIX):])
+
+
+def _photo_variant_ref_path(source_path, st):
+    # 공유폴더 캐시와 같은 규칙: 원본이 바뀌면 이름이 달라짐
+    key = hashlib.sha1(os.path.normcase(source_path).encode("utf-8")).hexdigest()
+    return os.path.join(app.config["PHOTO_VARIANT_FOLDER"], f"{key}-{st.st_mtime_ns}-{st.st_size}.ref")
+
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _render_photo_variant(data, size, fmt):
+    with Image.open(io.BytesIO(data)) as img:
+        # JPEG 는 디코딩부터 줄여서 (몇 MB 원본도 빠르게)
+        img.draft("RGB", (size, size))
+        img = ImageOps.exif_transpose(img)  # 카톡/폰 사진 회전 정보 반영
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        img.thumbnail((size, size), Image.LANCZOS)
+
+        out = io.BytesIO()
+        if fmt == "webp":
+            img.save(out, "WEBP", quality=PHOTO_VARIANT_QUALITY, method=4)
+        else:
+            img.save(out, "JPEG", quality=PHOTO_VARIANT_QUALITY, optimize=True, progressive=True)
+        return out.getvalue()
+
+
+def photo_variant(source_path, size, fmt):
+    """원본 사진 → (사본 경로, 내용 해시). 원본이 없으면 FileNotFoundError"""
+    folder = app.config["PHOTO_VARIANT_FOLDER"]
+    st = os.stat(source_path)
+    if not stat.S_ISREG(st.st_mode):
+        raise FileNotFoundError(source_path)
+
+    ref_path = _photo_variant_ref_path(source_path, st)
+    data = None
+    try:
+        with open(ref_path, encoding="ascii") as f:
+            digest = f.read().strip()
+        os.utime(ref_path)
+    except OSError:
+        with open(source_path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha1(data).hexdigest()
+        os.makedirs(folder, exist_ok=True)
+        _write_atomic(ref_path, digest.encode("ascii"))
+
+    variant_path = os.path.join(folder, f"{digest}-{size}.{fmt}")
+    try:
+        os.utime(variant_path)  # 최근 사용 표시 (용량 정리 때 오래 안 쓴 것부터 삭제)
+        return variant_path, digest
+    except FileNotFoundError:
+        pass
+
+    if data is None:
+        with open(source_path, "rb") as f:
+            data = f.read()
+    _write_atomic(variant_path, _render_photo_variant(data, size, fmt))
+
+    PHOTO_VARIANT_STATE["created"] += 1
+    if PHOTO_VARIANT_STATE["created"] % PHOTO_VARIANT_PRUNE_EVERY == 0:
+        _prune_cache_folder(folder, app.config["PHOTO_VARIANT_MAX_BYTES"])
+    return variant_path, digest
+
+
+def accepts_webp():
+    """Accept 에 image/webp 가 직접 적혀 있을 때만 (image/* , */* 는 WebP 를 못 여는 브라우저도 보냄)"""
+    return any(mimetype == "image/webp" and quality > 0 for mimetype, quality in request.accept_mimetypes)
+
+
+@app.route("/photo/<int:size>/<path:filename>")
+def serve_photo_variant(size, filename):
+    if size not in PHOTO_VARIANT_SIZES:
+        return "지원하지 않는 크기입니다.", 404
+    source_path = safe_join(app.config["UPLOAD_FOLDER"], filename)
+    if source_path is None:
+        return "파일을 찾을 수 없습니다.", 404
+
+    fmt = "webp" if features.check("webp") and accepts_webp() else "jpeg"
+    try:
+        path, digest = photo_variant(source_path, size, fmt)
+    except FileNotFoundError:
+        return "파일을 찾을 수 없습니다.", 404
+    except Exception as e:
+        # 깨진 사진 등 → 원본이라도 보여줌
+        print(f"사진 사본 생성 실패 ({filename}): {e}")
+        response = send_share_file(app.config["UPLOAD_FOLDER"], filename, PHOTO_MAX_AGE)
+        if not isinstance(response, tuple):
+            response.vary.add("Accept")
+        return response
+
+    response = send_file(path, mimetype=f"image/{fmt}", conditional=True, max_age=PHOTO_MAX_AGE,
+                         etag=f"{digest}-{size}-{fmt}")
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.vary.add("Accept")
+    return response
+
+
+def uploaded_photo_path(file_path):
+    """
+    DB 사진 경로 → 찍은사진 폴더 안의 실제 경로 (폴더 밖을 가리키면 None)
+    - '/static/uploads/<상대경로>' (사진 올리기)
+    - '/' + 찍은사진 폴더 경로 (압축 사진 일괄 등록)
+    """
+    if not file_path:
+        return None
+    if file_path.startswith(PHOTO_UPLOAD_PREFIX):
+        rel = file_path[len(PHOTO_UPLOAD_PREFIX):]
+    else:
+        folder = app.config["UPLOAD_FOLDER"].replace("\\", "/").strip("/") + "/"
+        path = file_path.lstrip("/")
+        if not path.startswith(folder):
+            return None
+        rel = path[len(folder):]
+    return safe_join(app.config["UPLOAD_FOLDER"], rel)
+
+
+def evict_photo_caches(source_paths):
+    """원본 사진들의 로컬 캐시 정리: 공유폴더 복사본 + 크기별 사본(.ref 와 그 내용 해시의 사본), 폴더는 한 번씩만 훑음"""
+    keys = {hashlib.sha1(os.path.normcase(p).encode("utf-8")).hexdigest() for p in source_paths}
+    if not keys:
+        return
+    variant_folder = app.config["PHOTO_VARIANT_FOLDER"]
+
+    def scan(folder, prefixes):
+        try:
+            return [e.path for e in os.scandir(folder) if e.name.split("-", 1)[0] in prefixes and not e.name.endswith(".tmp")]
+        except OSError:
+            return []
+
+    stale = scan(app.config["SHARE_CACHE_FOLDER"], keys) + scan(variant_folder, keys)
+
+    # 같은 내용의 다른 사진은 다음 요청 때 다시 만들어짐
+    digests = set()
+    for path in stale:
+        if path.endswith(".ref"):
+            try:
+                with open(path, encoding="ascii") as f:
+                    digests.add(f.read().strip())
+            except OSError:
+                pass
+    if digests:
+        stale += scan(variant_folder, digests)
+
+    for path in stale:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def delete_uploaded_photos(file_paths):
+    """매물 사진 파일 삭제 (찍은사진 폴더 기준 경로로만) + 로컬 캐시 정리"""
+    deleted = []
+    for file_path in file_paths:
+        path = uploaded_photo_path(file_path)
+        if path is None:
+            print(f"사진 파일 삭제 건너뜀 (찍은사진 폴더 밖 경로): {file_path}")
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"사진 파일 삭제 실패 ({file_path}): {e}")
+        deleted.append(path)
+    evict_photo_caches(deleted)
+
+
+# ✅ 도면 폴더 목록은 메모리 색인으로 (공유폴더를 클릭마다 뒤지지 않음)
+#    - FLOORPLAN_RESCAN_INTERVAL 초마다 폴더 수정시간만 확인, 바뀐 폴더만 다시 읽음
+#    - os.scandir 는 목록을 받을 때 폴더 여부도 같이 받아와서 항목마다 isdir 를 또 묻지 않음
+FLOORPLAN_IMAGE_EXTS = ('.png', '.jpg', '.jpeg', '.gif', '.webp')
+FLOORPLAN_RESCAN_INTERVAL = 60  # 초
+
+FLOORPLAN_INDEX = {"regions": {}, "listings": {}, "checked_at": None, "version": 0}
+FLOORPLAN_INDEX_HOOKS = []  # 색인이 바뀔 때 호출할 캐시 비우기 함수들
+_FLOORPLAN_INDEX_LOCK = threading.Lock()
+
+
+def _floorplan_listing(path, old_listings, new_listings, force=False):
+    """폴더 항목 [(이름, 폴더여부)] — 수정시간이 그대로면 지난번 목록 재사용, 폴더가 없으면 None"""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+    cached = old_listings.get(path)
+    if not force and cached and cached[0] == mtime:
+        entries = cached[1]
+    else:
+        try:
+            with os.scandir(path) as it:
+                entries = tuple(sorted((e.name, e.is_dir()) for e in it))
+        except OSError:
+            return None
+    new_listings[path] = (mtime, entries)
+    return entries
+
+
+def refresh_floorplan_index(force=False):
+    """도면 폴더가 바뀌었으면 색인을 다시 만듦. 바뀐 경우에만 True"""
+    now = time.monotonic()
+    checked_at = FLOORPLAN_INDEX["checked_at"]
+    if not force and checked_at is not None and now - checked_at < FLOORPLAN_RESCAN_INTERVAL:
+        return False
+
+    with _FLOORPLAN_INDEX_LOCK:
+        # 기다리는 동안 다른 스레드가 이미 새로 만들었으면 그대로 사용
+        if not force and FLOORPLAN_INDEX["checked_at"] != checked_at:
+            return False
+
+        base_dir = app.config["FLOORPLAN_FOLDER"]
+        old_listings = FLOORPLAN_INDEX["listings"]
+        listings = {}
+        regions = {}
+
+        # 지역 폴더 → 건물 폴더 → 도면 파일
+        for region_folder, is_dir in _floorplan_listing(base_dir, old_listings, listings, force) or ():
+            if not is_dir:
+                continue
+            region_path = os.path.join(base_dir, region_folder)
+            buildings = {}
+            for b_folder, b_is_dir in _floorplan_listing(region_path, old_listings, listings, force) or ():
+                if not b_is_dir:
+                    continue
+                files = _floorplan_listing(os.path.join(region_path, b_folder), old_listings, listings, force) or ()
+                buildings[b_folder] = [f for f, f_is_dir in files if not f_is_dir and f.lower().endswith(FLOORPLAN_IMAGE_EXTS)]
+            regions[region_folder] = buildings
+
+        changed = regions != FLOORPLAN_INDEX["regions"]
+        FLOORPLAN_INDEX.update(listings=listings, checked_at=time.monotonic())
+        if changed:
+            FLOORPLAN_INDEX.update(regions=regions, version=FLOORPLAN_INDEX["version"] + 1)
+            for hook in FLOORPLAN_INDEX_HOOKS:
+                hook()
+        return changed
+
+
+def floorplan_regions():
+    """{지역 폴더: {건물 폴더: [도면 파일]}} (이름순)"""
+    refresh_floorplan_index()
+    return FLOORPLAN_INDEX["regions"]
+
+
+def _floorplan_key(name):
+    """DB 건물명 / 도면 폴더명 공통 비교 키 (별칭 규칙 적용 후 띄어쓰기 제거, 소문자)"""
+    return clean_building_name(name).replace(" ", "").lower()
+
+
+@lru_cache(maxsize=1)
+def _floorplan_lookup_table():
+    """
+    (정확히 같은 키 → 폴더, 키 긴 순서 목록, 키 짧은 순서 목록)
+    같은 키/길이끼리는 (지역, 건물) 이름순이라 폴더 목록 순서와 상관없이 결과가 항상 같음
+    """
+    entries = sorted(
+        (_floorplan_key(b_folder), region_folder, b_folder)
+        for region_folder, buildings in FLOORPLAN_INDEX["regions"].items()
+        for b_folder in buildings
+    )
+    entries = [e for e in entries if e[0]]
+
+    exact = {}
+    for key, region_folder, b_folder in entries:
+        exact.setdefault(key, (region_folder, b_folder))
+    longest_first = sorted(entries, key=lambda e: -len(e[0]))
+    shortest_first = sorted(entries, key=lambda e: len(e[0]))
+    return exact, longest_first, shortest_first
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def _find_floorplan_folder_cached(building_name):
+    key = _floorplan_key(building_name)
+    if not key:
+        return None
+
+    exact, longest_first, shortest_first = _floorplan_lookup_table()
+    if key in exact:
+        return exact[key]
+
+    # DB 건물명(예: 퀸즈10 A동 1003호)에 폴더명이 들어 있으면 가장 길게 일치한 폴더 (퀸즈1 보다 퀸즈10)
+    for folder_key, region_folder, b_folder in longest_first:
+        if folder_key in key:
+            return region_folder, b_folder
+
+    # 건물명이 폴더명의 일부면 가장 짧은(가장 가까운) 폴더
+    for folder_key, region_folder, b_folder in shortest_first:
+        if key in folder_key:
+            return region_folder, b_folder
+    return None
+
+
+def find_floorplan_folder(building_name):
+    """DB 건물명 → (지역 폴더, 건물 폴더) 또는 None. 건물명마다 한 번만 계산"""
+    refresh_floorplan_index()
+    refresh_alias_table()
+    return _find_floorplan_folder_cached(str(building_name))
+
+
+# 도면 폴더나 별칭 규칙이 바뀌면 매칭 결과를 다시 계산
+FLOORPLAN_INDEX_HOOKS.append(_floorplan_lookup_table.cache_clear)
+FLOORPLAN_INDEX_HOOKS.append(_find_floorplan_folder_cached.cache_clear)
+ALIAS_RELOAD_HOOKS.append(_floorplan_lookup_table.cache_clear)
+ALIAS_RELOAD_HOOKS.append(_find_floorplan_folder_cached.cache_clear)
+
+
 @app.route("/floorplans")
 @login_required
 def floorplans():
+    # ✅ 방금 도면을 넣었으면 ?refresh=1 로 바로 다시 읽기
+    if request.args.get("refresh"):
+        refresh_floorplan_index(force=True)
+
     # 지역별로 건물을 묶어서 딕셔너리로 만듦 (예: {'1.마곡': ['W타워3', '퀸즈9'], '2.마곡나루': [...]})
-    regions = {}
-    base_dir = app.config["FLOORPLAN_FOLDER"]
-    
-    if os.path.exists(base_dir):
-        # 1. 지역 폴더 탐색 (1.마곡, 2.마곡나루 등)
-        for region_folder in sorted(os.listdir(base_dir)):
-            region_path = os.path.join(base_dir, region_folder)
-            if os.path.isdir(region_path):
-                # 2. 지역 폴더 안의 건물 폴더 탐색
-                buildings = [b for b in sorted(os.listdir(region_path)) if os.path.isdir(os.path.join(region_path, b))]
-                if buildings:
-                    regions[region_folder] = buildings
-                    
+    regions = {region: list(buildings) for region, buildings in floorplan_regions().items() if buildings}
     return render_template("floorplans.html", regions=regions)
 
 
 @app.route("/api/floorplans/<path:building_name>")
 @login_required
 def api_get_floorplans(building_name):
-    base_dir = app.config["FLOORPLAN_FOLDER"]
     images = []
-    
-    if os.path.exists(base_dir):
-        target_region = None
-        target_building = None
-        
-        # 1. 모든 지역 폴더를 뒤지면서 해당 건물명 찾기
-        for region_folder in os.listdir(base_dir):
-            region_path = os.path.join(base_dir, region_folder)
-            if not os.path.isdir(region_path): continue
-            
-            for b_folder in os.listdir(region_path):
-                if os.path.isdir(os.path.join(region_path, b_folder)):
-                    # DB 건물명(예: 퀸즈9 A동)과 폴더명(퀸즈9)을 띄어쓰기 없이 비교해서 포함되면 매칭
-                    clean_req = building_name.replace(" ", "").lower()
-                    clean_folder = b_folder.replace(" ", "").lower()
-                    
-                    if clean_req in clean_folder or clean_folder in clean_req:
-                        target_region = region_folder
-                        target_building = b_folder
-                        break
-            if target_building:
-                break # 찾았으면 지역 탐색 중지
-
-        # 2. 건물을 찾았으면 그 안의 이미지들 불러오기
-        if target_region and target_building:
-            b_path = os.path.join(base_dir, target_region, target_building)
-            # 층별 이름순으로 정렬해서 가져오기 (1층, 2층...)
-            for f in sorted(os.listdir(b_path)):
-                if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.webp')):
-                    images.append(url_for('serve_floorplan', region=target_region, building=target_building, filename=f))
-                    
+
+    # ✅ DB 건물명(예: 퀸즈9 A동)과 폴더명(퀸즈9)을 같은 규칙으로 정규화해서 찾음 (건물명마다 한 번만 계산)
+    target = find_floorplan_folder(building_name)
+
+    # 건물을 찾았으면 그 안의 이미지들 (층별 이름순: 1층, 2층...)
+    if target:
+        target_region, target_building = target
+        for f in floorplan_regions().get(target_region, {}).get(target_building, ()):
+            images.append(url_for('serve_floorplan', region=target_region, building=target_building, filename=f))
+
     return jsonify({"images": images})
 
 
 @app.route("/floorplan_img/<region>/<building>/<filename>")
 @login_required
 def serve_floorplan(region, building, filename):
+    # ✅ 색인에 없는 파일은 공유폴더에 묻지 않고 바로 404
+    if filename not in floorplan_regions().get(region, {}).get(building, ()):
+        return "도면을 찾을 수 없습니다.", 404
     directory = os.path.join(app.config["FLOORPLAN_FOLDER"], region, building)
-    return send_from_directory(directory, filename)
+    return send_share_file(directory, filename, FLOORPLAN_MAX_AGE)
+
+# ✅ 큰 도면은 타일 피라미드로 (처음 보는 도면만 한 번 만들고 로컬 디스크에 보관)
+#    - 미리보기(FLOORPLAN_PREVIEW_SIZE) 를 먼저 띄우고, 확대하면 화면에 보이는 타일만 받아옴
+#    - 단계 0 = 원본 크기, 한 단계마다 가로/세로 절반
+#    - 피라미드 폴더 이름 = 원본 경로 해시-수정시간-크기 → 타일 주소가 바뀌지 않으니 브라우저에 오래 캐시
+#    - 요청 안에서는 만들지 않음: 처음 보는 도면은 백그라운드 스레드에 맡기고 202 + 원본 주소로 바로 응답
+#    - flask build-floorplan-tiles 로 전체 도면을 미리 만들어 둘 수 있음
+app.config.setdefault("FLOORPLAN_TILE_FOLDER", os.path.join(app.instance_path, "floorplan_tiles"))
+app.config.setdefault("FLOORPLAN_TILE_MAX_BYTES", 2 * 1024 * 1024 * 1024)
+FLOORPLAN_TILE_SIZE = 512
+FLOORPLAN_PREVIEW_SIZE = 1600
+FLOORPLAN_TILE_MIN_SIZE = 2400  # 이보다 작은 도면은 타일 없이 원본 그대로
+FLOORPLAN_TILE_QUALITY = 85
+FLOORPLAN_TILE_MAX_AGE = 365 * 24 * 3600
+FLOORPLAN_TILE_KEY = re.compile(r"^[0-9a-f]{40}-\d+-\d+$")
+FLOORPLAN_TILE_FAILED_MAX = 256  # 만들다 실패한 도면 기억 개수 (넘으면 비우고 다시 시도)
+_FLOORPLAN_TILE_BUILDER = {"pid": None, "pool": None}
+_FLOORPLAN_TILE_PENDING = set()  # 대기/생성 중인 피라미드 키 (끝나면 뺌)
+_FLOORPLAN_TILE_FAILED = set()
+_FLOORPLAN_TILE_GUARD = threading.Lock()
+
+
+def _floorplan_tile_key(source_path, st):
+    key = hashlib.sha1(os.path.normcase(source_path).encode("utf-8")).hexdigest()
+    return f"{key}-{st.st_mtime_ns}-{st.st_size}"
+
+
+def _open_floorplan_rgb(source_path):
+    # 수천 px 스캔본은 복사 한 번도 비싸서, 회전/색 변환은 필요할 때만 제자리에서
+    img = Image.open(source_path)
+    img.load()
+    ImageOps.exif_transpose(img, in_place=True)
+    # 투명 배경 PNG 는 흰 바탕으로 (JPEG 타일)
+    if img.mode in ("RGBA", "LA", "P"):
+        rgba = img.convert("RGBA")
+        rgb = Image.new("RGB", rgba.size, "white")
+        rgb.paste(rgba, mask=rgba.getchannel("A"))
+        return rgb
+    return img if img.mode == "RGB" else img.convert("RGB")
+
+
+def _write_floorplan_pyramid(source_path, out_dir):
+    """out_dir 에 preview.jpg, <단계>/<열>_<행>.jpg, info.json 생성 → info"""
+    img = _open_floorplan_rgb(source_path)
+    width, height = img.size
+
+    level_sizes = []
+    smallest = img
+    if max(width, height) > FLOORPLAN_TILE_MIN_SIZE:
+        level_img = img
+        while True:
+            lw, lh = level_img.size
+            level_dir = os.path.join(out_dir, str(len(level_sizes)))
+            os.makedirs(level_dir)
+            for row in range(math.ceil(lh / FLOORPLAN_TILE_SIZE)):
+                for col in range(math.ceil(lw / FLOORPLAN_TILE_SIZE)):
+                    x, y = col * FLOORPLAN_TILE_SIZE, row * FLOORPLAN_TILE_SIZE
+                    tile = level_img.crop((x, y, min(x + FLOORPLAN_TILE_SIZE, lw), min(y + FLOORPLAN_TILE_SIZE, lh)))
+                    tile.save(os.path.join(level_dir, f"{col}_{row}.jpg"), "JPEG", quality=FLOORPLAN_TILE_QUALITY)
+            level_sizes.append([lw, lh])
+            smallest = level_img
+            # 다음 단계가 미리보기보다 작아지면 그만 (그 뒤로는 미리보기로 충분)
+            if max(lw, lh) // 2 <= FLOORPLAN_PREVIEW_SIZE:
+                break
+            level_img = level_img.reduce(2)
+
+    # 미리보기는 가장 작은 단계에서 줄임 (원본에서 바로 줄이는 것보다 훨씬 빠름)
+    ratio = min(1.0, FLOORPLAN_PREVIEW_SIZE / max(width, height))
+    preview = smallest.resize((max(1, round(width * ratio)), max(1, round(height * ratio))), Image.LANCZOS)
+    preview.save(os.path.join(out_dir, "preview.jpg"), "JPEG", quality=FLOORPLAN_TILE_QUALITY, optimize=True)
+
+    info = {
+        "width": width,
+        "height": height,
+        "preview_width": preview.width,
+        "tiled": bool(level_sizes),
+        "tile_size": FLOORPLAN_TILE_SIZE,
+        "level_sizes": level_sizes,
+    }
+    with open(os.path.join(out_dir, "info.json"), "w", encoding="utf-8") as f:
+        json.dump(info, f)
+    return info
+
+
+def _read_floorplan_info(info_path):
+    try:
+        with open(info_path, encoding="utf-8") as f:
+            info = json.load(f)
+        os.utime(info_path)  # 최근 사용 표시 (용량 정리 때 오래 안 쓴 도면부터 삭제)
+        return info
+    except (OSError, ValueError):
+        return None
+
+
+def cached_floorplan_pyramid(source_path):
+    """원본 도면 → (피라미드 키, 만들어 둔 info 또는 None). 원본이 없으면 FileNotFoundError"""
+    st = os.stat(source_path)
+    if not stat.S_ISREG(st.st_mode):
+        raise FileNotFoundError(source_path)
+    key = _floorplan_tile_key(source_path, st)
+    return key, _read_floorplan_info(os.path.join(app.config["FLOORPLAN_TILE_FOLDER"], key, "info.json"))
+
+
+def floorplan_pyramid(source_path):
+    """원본 도면 → (피라미드 키, info). 없으면 지금 만들어서 보관 (CLI / 백그라운드 스레드에서 호출)"""
+    key, info = cached_floorplan_pyramid(source_path)
+    if info is not None:
+        return key, info
+
+    folder = app.config["FLOORPLAN_TILE_FOLDER"]
+    info_path = os.path.join(folder, key, "info.json")
+
+    # 임시 폴더에 다 만든 뒤 이름만 바꿈 → 다른 워커 프로세스가 반쯤 만든 타일을 보지 않음
+    tmp_dir = os.path.join(folder, f"{key}.{os.getpid()}.{threading.get_ident()}.tmp")
+    os.makedirs(tmp_dir)
+    try:
+        info = _write_floorplan_pyramid(source_path, tmp_dir)
+        os.rename(tmp_dir, os.path.join(folder, key))
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        # 다른 프로세스가 먼저 만들어 둔 경우 → 그쪽 결과를 씀
+        info = _read_floorplan_info(info_path)
+        if info is None:
+            raise
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    prune_floorplan_tiles()
+    return key, info
+
+
+def _floorplan_tile_executor():
+    """도면 타일 만들기 전용 스레드 1개 (프로세스별, gunicorn fork 후에도 새로 만듦)"""
+    with _FLOORPLAN_TILE_GUARD:
+        if _FLOORPLAN_TILE_BUILDER["pid"] != os.getpid():
+            _FLOORPLAN_TILE_BUILDER.update(
+                pid=os.getpid(),
+                pool=ThreadPoolExecutor(max_workers=1, thread_name_prefix="floorplan-tiles"),
+            )
+            _FLOORPLAN_TILE_PENDING.clear()
+        return _FLOORPLAN_TILE_BUILDER["pool"]
+
+
+def _build_floorplan_pyramid_job(key, source_path):
+    try:
+        with app.app_context():
+            floorplan_pyramid(source_path)
+    except Exception as e:
+        print(f"도면 타일 생성 실패 ({source_path}): {e}")
+        with _FLOORPLAN_TILE_GUARD:
+            if len(_FLOORPLAN_TILE_FAILED) >= FLOORPLAN_TILE_FAILED_MAX:
+                _FLOORPLAN_TILE_FAILED.clear()
+            _FLOORPLAN_TILE_FAILED.add(key)
+    finally:
+        with _FLOORPLAN_TILE_GUARD:
+            _FLOORPLAN_TILE_PENDING.discard(key)
+
+
+def schedule_floorplan_pyramid(key, source_path):
+    """피라미드 만들기를 백그라운드로 (같은 도면은 한 번만 대기열에) → 실패했던 도면이면 False"""
+    pool = _floorplan_tile_executor()
+    with _FLOORPLAN_TILE_GUARD:
+        if key in _FLOORPLAN_TILE_FAILED:
+            return False
+        if key in _FLOORPLAN_TILE_PENDING:
+            return True
+        _FLOORPLAN_TILE_PENDING.add(key)
+    pool.submit(_build_floorplan_pyramid_job, key, source_path)
+    return True
+
+
+def prune_floorplan_tiles(max_bytes=None):
+    """타일 폴더가 max_bytes 를 넘으면 오래 안 본 도면의 피라미드부터 통째로 삭제 → 삭제한 도면 수"""
+    folder = app.config["FLOORPLAN_TILE_FOLDER"]
+    max_bytes = app.config["FLOORPLAN_TILE_MAX_BYTES"] if max_bytes is None else max_bytes
+    try:
+        dirs = [e.path for e in os.scandir(folder) if e.is_dir() and FLOORPLAN_TILE_KEY.match(e.name)]
+    except OSError:
+        return 0
+
+    stats = []
+    for path in dirs:
+        try:
+            used = os.stat(os.path.join(path, "info.json")).st_mtime
+        except OSError:
+            used = 0
+        size = sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+        stats.append((used, size, path))
+    stats.sort(reverse=True)
+
+    total = sum(size for _, size, _ in stats)
+    evicted = 0
+    while stats and total > max_bytes:
+        _, size, path = stats.pop()
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        evicted += 1
+    return evicted
+
+
+@app.route("/floorplan_info/<region>/<building>/<filename>")
+@login_required
+def floorplan_info(region, building, filename):
+    if filename not in floorplan_regions().get(region, {}).get(building, ()):
+        return jsonify({"error": "도면을 찾을 수 없습니다."}), 404
+    source_path = safe_join(app.config["FLOORPLAN_FOLDER"], region, building, filename)
+    if source_path is None:
+        return jsonify({"error": "도면을 찾을 수 없습니다."}), 404
+
+    original = url_for("serve_floorplan", region=region, building=building, filename=filename)
+    try:
+        key, info = cached_floorplan_pyramid(source_path)
+        if info is None:
+            # 헤더만 읽어서 도면 이미지가 맞는지 확인 (전체 디코딩/타일 만들기는 백그라운드)
+            with Image.open(source_path):
+                pass
+    except (UnidentifiedImageError, Image.DecompressionBombError):
+        return jsonify({"error": "지원하지 않는 도면 파일입니다.", "original": original}), 415
+    except OSError:
+        return jsonify({"error": "도면을 찾을 수 없습니다."}), 404
+
+    if info is None:
+        if not schedule_floorplan_pyramid(key, source_path):
+            return jsonify({"error": "도면 타일을 만들지 못했습니다.", "original": original}), 415
+        # 만드는 동안은 원본 한 장으로 보기
+        return jsonify({"tiled": False, "building": True, "original": original, "preview": original}), 202
+
+    preview = url_for("floorplan_tile_file", key=key, name="preview.jpg")
+    return jsonify(dict(
+        info,
+        original=original,
+        # 작은 도면은 원본 그대로, 큰 도면은 미리보기부터
+        preview=preview if info["tiled"] else original,
+        tiles=preview.rsplit("/", 1)[0] + "/{level}/{col}_{row}.jpg",
+    ))
+
+
+@app.route("/floorplan_tiles/<key>/<path:name>")
+@login_required
+def floorplan_tile_file(key, name):
+    if not FLOORPLAN_TILE_KEY.match(key):
+        return "타일을 찾을 수 없습니다.", 404
+    response = send_from_directory(os.path.join(app.config["FLOORPLAN_TILE_FOLDER"], key), name,
+                                   max_age=FLOORPLAN_TILE_MAX_AGE)
+    # 같은 주소의 타일은 절대 바뀌지 않음 (원본이 바뀌면 키가 바뀜)
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+    return response
+
+
+@app.cli.command("build-floorplan-tiles")
+def build_floorplan_tiles_command():
+    """flask build-floorplan-tiles : 모든 도면의 타일 피라미드를 미리 만들어 둠"""
+    refresh_floorplan_index(force=True)
+    built = tiled = failed = 0
+    for region_folder, buildings in floorplan_regions().items():
+        for b_folder, files in buildings.items():
+            for f in files:
+                try:
+                    _, info = floorplan_pyramid(os.path.join(app.config["FLOORPLAN_FOLDER"], region_folder, b_folder, f))
+                    built += 1
+                    tiled += info["tiled"]
+                except Exception as e:
+                    failed += 1
+                    print(f"도면 타일 생성 실패 ({region_folder}/{b_folder}/{f}): {e}")
+    print(f"도면 {built}개 준비 (타일 {tiled}개, 실패 {failed}개)")
 
 # ==========================================
 # 📱 모바일 홈화면용 '돋보기 안의 집' 아이콘 생성
@@ -0,0 +1,104 @@
+"""
+포스 '매물인쇄' PDF 페이지 OCR (app.py 의 PDF 등록 작업이 프로세스 풀로 나눠서 실행)
+
+- Windows(spawn) 에서는 풀의 자식 프로세스가 이 모듈을 새로 import 하므로
+  여기에는 DB/앱 설정/시작 작업 없이 페이지 렌더링 + OCR + 결과 캐시 함수만 둠
+- 캐시 폴더 등 설정값은 app.py 에서 인자로 넘겨줌
+"""
+import hashlib
+import io
+import json
+import os
+
+from PIL import Image
+
+# 📄 설치 안 되어 있으면 PDF 등록만 비활성 (app.py 에서 None 여부 확인)
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
+try:
+    import pytesseract
+except ImportError:
+    pytesseract = None
+
+POS_PDF_SCALE = 2  # 확대 렌더(정확도↑)
+POS_PDF_LANG = "kor+eng"
+
+
+# ✅ 페이지 OCR 결과 캐시 (렌더된 페이지 이미지 해시 + 언어 + 배율 → 단어 박스 JSON)
+#    같은 매물인쇄 PDF 를 몇 페이지만 바꿔서 다시 올리면 바뀐 페이지만 OCR
+def _ocr_cache_path(cache_dir, page_hash, lang, scale):
+    return os.path.join(cache_dir, f"{page_hash}-{lang}-x{scale}.json")
+
+
+def _ocr_cache_read(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            cached = json.load(f)
+        os.utime(path)  # 최근 사용 표시 (용량 정리 때 오래 안 쓴 것부터 삭제)
+        return cached["items"], tuple(cached["size"])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _ocr_cache_write(path, items, size):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"items": items, "size": list(size)}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"OCR 캐시 저장 실패: {e}")
+
+
+def ocr_pdf_page(pdf_path, page_index, scale=POS_PDF_SCALE, lang=POS_PDF_LANG, cache_dir=None):
+    """
+    PDF 한 페이지 렌더링 + OCR → (단어 박스 items, (폭, 높이), OCR 캐시 적중 여부)
+    프로세스 풀 안에서 실행되므로 문서는 페이지마다 각자 열고, 결과는 dict/tuple 만 돌려줌
+    cache_dir 를 주면 렌더된 이미지 해시로 이전 OCR 결과를 먼저 찾음
+    """
+    doc = fitz.open(pdf_path)
+    try:
+        page = doc.load_page(page_index)
+        pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale), alpha=False)
+
+        cache_path = None
+        if cache_dir:
+            page_hash = hashlib.sha1(f"{pix.width}x{pix.height}x{pix.n}:".encode() + pix.samples).hexdigest()
+            cache_path = _ocr_cache_path(cache_dir, page_hash, lang, scale)
+            cached = _ocr_cache_read(cache_path)
+            if cached is not None:
+                return cached[0], cached[1], True
+
+        img = Image.open(io.BytesIO(pix.tobytes("png"))).convert("RGB")
+    finally:
+        doc.close()
+
+    data = pytesseract.image_to_data(img, lang=lang, output_type=pytesseract.Output.DICT)
+
+    items = []
+    n = len(data.get("text", []))
+    for i in range(n):
+        text = (data["text"][i] or "").strip()
+        if not text:
+            continue
+        try:
+            conf = float(data["conf"][i])
+        except:
+            conf = -1
+        if conf < 40:
+            continue
+        items.append({
+            "text": text,
+            "x": int(data["left"][i]),
+            "y": int(data["top"][i]),
+            "w": int(data["width"][i]),
+            "h": int(data["height"][i]),
+            "conf": conf
+        })
+
+    if cache_path:
+        _ocr_cache_write(cache_path, items, img.size)
+    return items, img.size, False
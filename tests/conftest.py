@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# 저장소 루트의 app.py 를 그대로 import (운영 DB instance/database.db, 결과 캐시 instance/query_cache.db 는 건드리지 않음)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_tmp = tempfile.mkdtemp(prefix="mrefs-test-")
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(_tmp, "database.db"))
+os.environ.setdefault("QUERY_CACHE_PATH", os.path.join(_tmp, "query_cache.db"))
@@ -0,0 +1,133 @@
+"""
+별칭 매처(AliasMatcher) 동치 검사
+- 기대값은 기준 커밋(규칙을 replace/re.sub 로 하나씩 돌리던 clean_building_name)의 결과를 그대로 얼려둔 것
+- 겹치는 별칭(우성에스비타워2/우성에스비타워/우성에스비, 747/747타워), replace_if(랜드파크 오비/오씨),
+  regex(퀸즈파크/보타닉파크/그랑트윈), func(류마타워) 규칙을 모두 포함
+"""
+import pytest
+
+from app import AliasMatcher, _load_alias_table, app, clean_building_name
+
+# (원본 건물명, 기준 clean_building_name 결과)
+BASELINE_CASES = [
+    ("우성에스비타워2 1203호", "우성SB2 1203호"),
+    ("우성에스비타워 805호", "우성SB1 805호"),
+    ("우성에스비 3층", "우성SB1 3층"),
+    ("마곡에스비타워3 B동 401호", "우성SB3 B동 401호"),
+    ("747타워 1001호", "747타워 1001호"),
+    ("747 1001호", "1001호"),
+    ("747 마곡747타워 5층", "마곡747타워 5층"),
+    ("두산더랜드파크 제오비동 1203호", "랜드파크 제오B동 1203호"),
+    ("더랜드파크 오씨동 305호", "랜드파크 오C동 305호"),
+    ("랜드파크 오비 1102호", "랜드파크 B동 1102호"),
+    ("랜드파크 제오씨 1004호", "랜드파크 C동 1004호"),
+    ("오비상가 101호", "오비상가 101호"),
+    ("제에이동 101호 마곡엠밸리", "A동 101호 마곡엠밸리"),
+    ("보타닉비즈타워 제비동 702호", "보타닉비즈타워 B동 702호"),
+    ("제디동 301호", "D동 301호"),
+    ("힐스테이트 씨동 1201호", "힐스테이트 C동 1201호"),
+    ("류마타워 2차 1105호", "류마타워2 1105호"),
+    ("류마타워2 801호", "류마타워2 801호"),
+    ("류마타워 1005호", "류마타워1 1005호"),
+    ("류마타워12 101호", "류마타워1 12 101호"),
+    ("류마타워 1 203호", "류마타워1 203호"),
+    ("문영퀸즈파크 나인 A동 1003호", "퀸즈9 A동 1003호"),
+    ("퀸즈파크9차 B동 915호", "퀸즈9 B동 915호"),
+    ("퀸즈파크 텐 607호", "퀸즈10 A동 607호"),
+    ("퀸즈파크10 1203호", "퀸즈10 A동 1203호"),
+    ("퀸즈파크 11차 514호", "퀸즈11 B동 514호"),
+    ("퀸즈파크11 812호", "퀸즈11 B동 812호"),
+    ("퀸즈파크 12차 1210호", "퀸즈12 1210호"),
+    ("퀸즈파크13 101호", "퀸즈13 101호"),
+    ("퀸즈11 305호", "퀸즈11 305호"),
+    ("퀸즈9 C동-1135호", "퀸즈9 C동 1135호"),
+    ("마곡동 그랑트윈타워 A동 801호", "그랑트윈타워 A동 801호"),
+    ("마곡동그랑트윈타워 B동 1203호", "그랑트윈타워 B동 1203호"),
+    ("마곡그랑트윈타워 302호", "그랑트윈타워 302호"),
+    ("롯데캐슬 르웨스트 상가 101호", "르웨스트웍스"),
+    ("롯데캐슬르웨스트 오피스 505호", "르웨스트웍스"),
+    ("마곡보타닉파크타워 1차 603호", "보타닉파크1 603호"),
+    ("보타닉파크 타워 2 905호", "보타닉파크2905호"),
+    ("보타닉파크타워3 1101호", "보타닉파크31101호"),
+    ("보타닉파크 3차 201호", "보타닉파크3 201호"),
+    ("마곡595 702호", "595타워 702호"),
+    ("홈앤쇼핑사옥 3층", "홈앤쇼핑 3층"),
+    ("웰튼메디플렉스 2층 일부", "웰튼병원 2층 일부"),
+    ("마곡엠밸리9단지 제업무시설동 510호", "엠밸리 9단지 510호"),
+    ("마곡엠밸리9단지 제판매시설2동 105호", "엠밸리 9단지 105호"),
+    ("발산더블유타워 305호", "W타워2 305호"),
+    ("열린엠타워2 1002호", "열린M타워 1002호"),
+    ("외 1필지 마곡역한일노벨리아타워 1203호", "한일노벨리아 1203호"),
+    ("외 2필지 가양역더스카이밸리5차 지식산업센터 B동 805호", "스카이밸리 B동 805호"),
+    ("마곡지웰타워 908호", "지웰타워 908호"),
+    ("이너매스마곡2 712호", "이너매스2 712호"),
+    ("이너매스마곡1 310호", "이너매스1 310호"),
+    ("놀라움마곡지식산업센터 504호", "놀라움 504호"),
+    ("엠밸리더블유타워3주1 1108호", "W타워3 1108호"),
+    ("엠밸리더블유타워4 605호", "W타워4 605호"),
+    ("에이스타워마곡 902호", "에이스타워1 902호"),
+    ("마곡사이언스타워2 704호", "사이언스타워2 704호"),
+    ("마곡엠시그니처 1005호", "엠시그니처 1005호"),
+    ("마곡센트럴타워2 1201호", "센트럴타워2 1201호"),
+    ("마곡센트럴타워1 301호", "센트럴타워1 301호"),
+    ("마곡나루역프라이빗타워2 808호", "안강2 808호"),
+    ("마곡나루역 프라이빗타워 1 507호", "안강1 507호"),
+    ("외 1필지 아벨테크노 402호", "아벨테크노 402호"),
+    ("마곡테크노타워2 1010호", "테크노타워2 1010호"),
+    ("리더스퀘어마곡 609호", "리더스퀘어 609호"),
+    ("한양더챔버 1동 1103호", "한양더챔버 1103호"),
+    ("외 1필지 제원그로브업무 A동 1502호", "원그로브 A동 1502호"),
+    ("외 1필지 원그로브업무 B동 801호", "원그로브 B동 801호"),
+    ("리더스타워마곡 405호", "리더스타워 405호"),
+    ("마곡나루역보타닉비즈타워 1107호", "보타닉비즈타워 1107호"),
+    ("마곡엠밸리7단지 상가 103호", "엠밸리7단지 상가 103호"),
+    ("외 2필지 델타빌딩 701호", "델타빌딩 701호"),
+    ("외 1필지 엔에이치서울축산농협엔에이치서울타워 12층", "NH서울타워 12층"),
+    ("지엠지엘스타 506호", "GMG엘스타 506호"),
+    ("케이스퀘어마곡업무시설 B동 902호", "케이스퀘어 B동 902호"),
+    ("르웨스트시티 제본동 2층", "르웨스트시티 2층"),
+    ("보타닉게이트마곡디38지식산업센터 1004호", "보타닉게이트 1004호"),
+    ("외 3필지 마곡아이파크디어반 305호", "아이파크디어반 305호"),
+    ("쿠쿠마곡빌딩 4층", "쿠쿠빌딩 4층"),
+    ("마곡보타닉파크프라자를 201호", "보타닉파크프라자 201호"),
+    ("마곡보타닉파크프라자 102호", "보타닉파크프라자 102호"),
+    ("엘케이빌딩 3층", "LK빌딩 3층"),
+    ("에스에이치빌딩 지상 2층", "SH빌딩 2층"),
+    ("외 1필지 우림 블루나인 비즈니스센터 1306호", "우림블루나인 1306호"),
+    ("리더스애비뉴마곡 308호", "리더스애비뉴 308호"),
+    ("리더스애비뉴 마곡 410호", "리더스애비뉴 410호"),
+    ("리더스에비뉴 1102호", "리더스애비뉴 1102호"),
+    ("799-1 랜드파크 B동 1203호", "랜드파크 B동 1203호"),
+    ("747 웰튼병원 3층 전체", "웰튼병원 3층 전체"),
+    ("12 퀸즈파크 9차 A동 1007호", "퀸즈9 A동 1007호"),
+    ("마곡동 760 르웨스트웍스 505호", "마곡동 760 르웨스트웍스 505호"),
+    ("르웨스트웍스 제 8층 801호", "르웨스트웍스 801호"),
+    ("W타워3 8F", "W타워3 8층"),
+    ("W타워3 8f 802호", "W타워3 802호"),
+    ("센트럴타워2 제944호", "센트럴타워2 944호"),
+    ("건축물대장 면적 확인요청 놀라움 1층 101호", "놀라움 101호"),
+    ("기준검수요청 SH빌딩 B1층", "SH빌딩 B1층"),
+    ("그랑트윈타워 A동 - 503호", "그랑트윈타워 A동 503호"),
+    ("  마곡  엠밸리  9단지  ", "마곡 엠밸리 9단지"),
+    ("", ""),
+    ("없는건물 1층", "없는건물 1층"),
+    ("나인스퀘어 제1005호", "나인스퀘어 1005호"),
+    ("3 원그로브 A동 1201호", "원그로브 A동 1201호"),
+    ("2 홈앤쇼핑 5층", "홈앤쇼핑 5층"),
+]
+
+
+@pytest.mark.parametrize("raw, expected", BASELINE_CASES)
+def test_clean_building_name_matches_baseline(raw, expected):
+    assert clean_building_name(raw) == expected
+
+
+@pytest.mark.parametrize("raw, _expected", BASELINE_CASES)
+def test_matcher_matches_sequential_rules(raw, _expected):
+    """한 번에 훑는 매처 == 규칙표를 위에서부터 하나씩 전부 적용"""
+    _, _, (dong, building, combined) = _load_alias_table(app.config["ALIAS_FILE"])
+    for matcher in (dong, building, combined):
+        text = raw
+        for _, fn in matcher.rules:
+            text = fn(text)
+        assert matcher.apply(raw) == text
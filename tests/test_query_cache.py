@@ -0,0 +1,27 @@
+"""목록 결과 캐시가 다른 DB / 백업에서 되돌린 DB 의 결과를 돌려주지 않는지"""
+from app import QueryResultCache
+
+
+def test_sync_keeps_cache_for_same_db(tmp_path):
+    cache = QueryResultCache(str(tmp_path / "query_cache.db"))
+    assert cache.sync("db-a", 0) is False
+    cache.set(("k", 3), {"ids": [1]})
+    assert cache.sync("db-a", 3) is False
+    assert cache.get(("k", 3)) == {"ids": [1]}
+
+
+def test_sync_clears_cache_for_other_db(tmp_path):
+    cache = QueryResultCache(str(tmp_path / "query_cache.db"))
+    cache.sync("db-a", 0)
+    cache.set(("k", 3), {"ids": [1]})
+    assert cache.sync("db-b", 3) is True
+    assert cache.get(("k", 3)) is None
+
+
+def test_sync_clears_cache_when_generation_went_back(tmp_path):
+    # 같은 DB 를 백업에서 되돌리면 세대 번호가 캐시에 남은 것보다 작아짐
+    cache = QueryResultCache(str(tmp_path / "query_cache.db"))
+    cache.sync("db-a", 0)
+    cache.set(("k", 9), {"ids": [1]})
+    assert cache.sync("db-a", 5) is True
+    assert cache.get(("k", 9)) is None
@@ -0,0 +1,15 @@
+"""목록/검색 대표 조회가 풀스캔/정렬용 임시 B-tree 로 되돌아가지 않는지 (flask check-query-plans 와 같은 점검)"""
+from app import LOCATION_MAPPING, QUERY_PLAN_KNOWN_EXCEPTIONS, app, query_plan_problems
+
+
+def test_query_plans_use_indexes():
+    with app.app_context():
+        assert query_plan_problems() == []
+
+
+def test_location_shapes_use_real_stations():
+    # 역 이름이 별칭 파일에 없으면 필터가 빠진 채로 점검돼서 의미가 없음
+    for _, params, _, _ in QUERY_PLAN_KNOWN_EXCEPTIONS:
+        for key, value in (params.items() if isinstance(params, dict) else params):
+            if key == "location":
+                assert value in LOCATION_MAPPING